@@ -1,17 +1,23 @@
+import time
+
 import torch
 import copy
 
 try:
     from .utils.data_collector import DataCollector
+    from .utils.telemetry import Telemetry, tensor_bytes
 except ImportError:
     from utils.data_collector import DataCollector
+    from utils.telemetry import Telemetry, tensor_bytes
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
 
 class A2CTrainer:
     def __init__(self, net, out_num, environment, batch_size,
-                 gamma, beta_entropy, learning_rate, clip_size):
+                 gamma, beta_entropy, learning_rate, clip_size,
+                 epochs=4, minibatch_size=None, target_kl=0.01, max_grad_norm=0.5,
+                 telemetry=None):
 
         self.net = net.to(device)
         self.new_net = copy.deepcopy(net).to(device)
@@ -19,9 +25,21 @@ class A2CTrainer:
         self.beta_entropy = beta_entropy
         self.learning_rate = learning_rate
         self.clip_size = clip_size
+        self.epochs = epochs
+        # four minibatches per epoch unless set
+        self.minibatch_size = minibatch_size or max(1, batch_size // 4)
+        self.target_kl = target_kl
+        self.max_grad_norm = max_grad_norm
         self.optimizer = torch.optim.Adam(
             self.new_net.parameters(), lr=self.learning_rate)
-        self.data = DataCollector(net, out_num, environment, gamma)
+        self.telemetry = telemetry or Telemetry(enabled=False)
+        self.data = DataCollector(net, out_num, environment, gamma, self.telemetry)
+
+        # learner statistics
+        self.total_samples = 0
+        self.total_updates = 0
+        self.samples_to_reward = []
+        self.last_update_info = {}
 
     def calculate_actor_loss(self, ratio, advantage):
         opt1 = ratio * advantage
@@ -32,28 +50,98 @@ class A2CTrainer:
     def calculate_critic_loss(self, advantage):
         return 0.5 * advantage.pow(2).mean()
 
-    def train(self, make_video=False):
-        self.data.clear_previous_batch_data()
-        self.data.collect_data_for(
-            batch_size=self.batch_size, make_video=make_video)
-        self.data.stack_data()
+    def minibatches(self, number_of_samples):
+        minibatch_size = self.minibatch_size or number_of_samples
+        permutation = torch.randperm(number_of_samples).to(device)
+        for start in range(0, number_of_samples, minibatch_size):
+            yield permutation[start:start + minibatch_size]
+
+    def evaluate(self, states, actions):
+        return self.new_net.evaluate(states, actions)
+
+    def approximate_kl(self, ratio, log_ratio):
+        # low variance estimator of KL(old || new)
+        return ((ratio - 1) - log_ratio).mean().item()
+
+    def update(self):
+        states = self.data.states
+        actions = self.data.actions
+        old_action_logarithms = self.data.action_logarithms
+        Qvals = self.data.Qval
+
+        with torch.no_grad(), self.telemetry.stage('evaluate'):
+            _, old_values, _ = self.new_net.evaluate(states, actions)
+            advantages = Qvals - old_values
+            if len(advantages) > 1:
+                advantages = (advantages - advantages.mean()) / (advantages.std() + 1e-8)
 
-        images = self.data.images
+        updates = 0
+        epochs = 0
+        approx_kl = 0.0
+        kl_exceeded = False
+        start = time.perf_counter()
+        while epochs < self.epochs and not kl_exceeded:
+            epochs += 1
+            for indices in self.minibatches(len(actions)):
+                with self.telemetry.stage('evaluate'):
+                    action_logarithms, values, entropy = self.evaluate(
+                        states[indices], actions[indices])
 
-        action_logarithms, Qval, entropy = self.new_net.evaluate(
-            self.data.states, self.data.actions)
+                log_ratio = action_logarithms - old_action_logarithms[indices]
+                ratio = torch.exp(log_ratio).to(device)
+                actor_loss = self.calculate_actor_loss(ratio, advantages[indices])
+                critic_loss = self.calculate_critic_loss(Qvals[indices] - values)
+
+                loss = actor_loss + critic_loss + self.beta_entropy * entropy.mean()
+
+                with self.telemetry.stage('backward'):
+                    self.optimizer.zero_grad()
+                    loss.backward()
+                    if self.max_grad_norm is not None:
+                        torch.nn.utils.clip_grad_norm_(
+                            self.new_net.parameters(), self.max_grad_norm)
+                with self.telemetry.stage('optimizer_step'):
+                    self.optimizer.step()
+                self.telemetry.count('updates')
+                updates += 1
+
+                with torch.no_grad():
+                    approx_kl = self.approximate_kl(ratio, log_ratio)
+                if self.target_kl is not None and approx_kl > 1.5 * self.target_kl:
+                    kl_exceeded = True
+                    break
+
+        elapsed = time.perf_counter() - start
+        self.total_updates += updates
+        self.last_update_info = {
+            'epochs': epochs,
+            'updates': updates,
+            'approx_kl': approx_kl,
+            'updates_per_second': updates / elapsed if elapsed > 0 else float('inf'),
+        }
+
+    def train(self, make_video=False):
+        with self.telemetry.iteration():
+            self.data.clear_previous_batch_data()
+            self.data.collect_data_for(
+                batch_size=self.batch_size, make_video=make_video)
+            with self.telemetry.stage('stack_data'):
+                self.data.stack_data()
 
-        ratio = torch.exp(action_logarithms -
-                          self.data.action_logarithms.detach()).to(device)
-        advantage = self.data.Qval - Qval.detach()
-        actor_loss = self.calculate_actor_loss(ratio, advantage)
-        critic_loss = self.calculate_critic_loss(advantage)
+            images = self.data.images
 
-        loss = actor_loss + critic_loss + self.beta_entropy * entropy.mean()
+            self.update()
 
-        self.optimizer.zero_grad()
-        loss.backward()
-        self.optimizer.step()
+            with self.telemetry.stage('load_state_dict'):
+                self.net.load_state_dict(self.new_net.state_dict())
 
-        self.net.load_state_dict(self.new_net.state_dict())
-        return sum(self.data.rewards), self.net, images
+            reward = sum(self.data.rewards)
+            self.total_samples += len(self.data.rewards)
+            self.samples_to_reward.append((self.total_samples, reward))
+            if self.telemetry.enabled:
+                self.telemetry.gauge('reward', float(reward))
+                self.telemetry.gauge('approx_kl', self.last_update_info['approx_kl'])
+                self.telemetry.gauge('tensor_bytes', tensor_bytes(
+                    self.net, self.new_net, self.optimizer,
+                    self.data.states, self.data.actions, self.data.action_logarithms))
+        return reward, self.net, images
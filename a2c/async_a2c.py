@@ -0,0 +1,278 @@
+import queue
+import random
+import time
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+
+try:
+    from .utils.data_collector import DataCollector
+    from .utils.shared_weights import SharedWeights
+    from .utils.telemetry import Telemetry, tensor_bytes
+    from .utils.vtrace import vtrace
+except ImportError:
+    from utils.data_collector import DataCollector
+    from utils.shared_weights import SharedWeights
+    from utils.telemetry import Telemetry, tensor_bytes
+    from utils.vtrace import vtrace
+
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+QUEUE_POLL_INTERVAL = 0.1
+
+
+def run_actor(actor_id, net_factory, env_factory, shared_weights, rollout_queue,
+              stop_event, unroll_length, gamma, seed, actor_quantizer=None):
+    """Actor process: collects rollouts with the latest published weights.
+
+    With an actor_quantizer the rollouts are collected by a quantized copy of
+    the policy, requantized every time new weights are loaded and
+    recalibrated as often as the quantizer's refresh settings allow.
+    """
+    torch.set_num_threads(1)
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+    net = net_factory()
+    collector = DataCollector(net, None, env_factory(), gamma)
+    version = None
+    if actor_quantizer is not None:
+        shared_weights.load_into(net)
+        actor_quantizer.record(collector.env, net)
+
+    while not stop_event.is_set():
+        loaded_version = shared_weights.load_into(net, version)
+        if loaded_version != version and actor_quantizer is not None:
+            collector.net = actor_quantizer(net)
+        version = loaded_version
+
+        collector.clear_previous_batch_data()
+        with torch.no_grad():
+            collector.collect_data_for(batch_size=unroll_length)
+        collector.stack_data()
+        # the learner bootstraps a rollout cut at unroll_length from its own
+        # value of the state after the last step, built like the other states
+        if collector.done:
+            bootstrap_state = None
+        else:
+            with torch.no_grad():
+                _, bootstrap_state = collector.net.action_distribution(
+                    collector.last_observation['picture'],
+                    collector.last_observation['thresholds'])
+            bootstrap_state = bootstrap_state.cpu().numpy()
+
+        # plain arrays are pickled through the queue, which avoids keeping a
+        # shared memory segment open for every rollout
+        rollout = {
+            'actor_id': actor_id,
+            'version': version,
+            'states': collector.states.cpu().numpy(),
+            'actions': collector.actions.cpu().numpy(),
+            'action_logarithms': collector.action_logarithms.cpu().numpy(),
+            'rewards': np.asarray(collector.rewards, dtype=np.float32),
+            'done': collector.done,
+            'bootstrap_state': bootstrap_state,
+        }
+        while not stop_event.is_set():
+            try:
+                rollout_queue.put(rollout, timeout=QUEUE_POLL_INTERVAL)
+                break
+            except queue.Full:
+                continue
+
+
+class AsyncA2CTrainer:
+    """Actor-learner trainer where simulation and backprop run concurrently.
+
+    Each actor process owns a SwarmBall env built by env_factory and a policy
+    built by net_factory, and streams rollouts into a shared queue. The learner
+    (the process calling train) consumes them, corrects for policy lag with
+    V-trace and publishes new weights to the actors through shared memory.
+    Both factories have to be picklable, e.g. module level functions.
+    An actor_quantizer, such as policy_network.quantization.ActorQuantizer,
+    makes the actors collect with an int8 copy of the policy while the
+    learner keeps training in fp32. telemetry only covers the learner, the
+    env_steps it counts are the samples received from the actors.
+    """
+
+    def __init__(self, net, net_factory, env_factory, number_of_actors,
+                 unroll_length, gamma, beta_entropy, learning_rate,
+                 rollouts_per_update=1, rho_bar=1.0, c_bar=1.0,
+                 max_grad_norm=0.5, queue_size=None, start_method='spawn', seed=0,
+                 actor_quantizer=None, telemetry=None):
+
+        self.net = net.to(device)
+        self.net_factory = net_factory
+        self.env_factory = env_factory
+        self.number_of_actors = number_of_actors
+        self.unroll_length = unroll_length
+        self.gamma = gamma
+        self.beta_entropy = beta_entropy
+        self.learning_rate = learning_rate
+        self.rollouts_per_update = rollouts_per_update
+        self.rho_bar = rho_bar
+        self.c_bar = c_bar
+        self.max_grad_norm = max_grad_norm
+        self.seed = seed
+        self.actor_quantizer = actor_quantizer
+        self.telemetry = telemetry or Telemetry(enabled=False)
+        self.optimizer = torch.optim.Adam(
+            self.net.parameters(), lr=self.learning_rate)
+
+        self._context = mp.get_context(start_method)
+        self._queue_size = queue_size or 2 * number_of_actors
+        self._actors = []
+        self._rollout_queue = None
+        self._stop_event = None
+        self.shared_weights = None
+
+        # learner statistics
+        self.total_samples = 0
+        self.total_updates = 0
+        self.samples_to_reward = []
+        self.last_update_info = {}
+
+    def start(self):
+        self.shared_weights = SharedWeights(self.net, self._context)
+        self._rollout_queue = self._context.Queue(maxsize=self._queue_size)
+        self._stop_event = self._context.Event()
+        for actor_id in range(self.number_of_actors):
+            actor = self._context.Process(
+                target=run_actor,
+                args=(actor_id, self.net_factory, self.env_factory, self.shared_weights,
+                      self._rollout_queue, self._stop_event, self.unroll_length,
+                      self.gamma, self.seed + actor_id, self.actor_quantizer),
+                daemon=True)
+            actor.start()
+            self._actors.append(actor)
+
+    def close(self, timeout=5.0):
+        if self._stop_event is None:
+            return
+        self._stop_event.set()
+        # actors blocked on a full queue need it drained before they can exit
+        while any(actor.is_alive() for actor in self._actors):
+            try:
+                self._rollout_queue.get(timeout=QUEUE_POLL_INTERVAL)
+            except queue.Empty:
+                pass
+            timeout -= QUEUE_POLL_INTERVAL
+            if timeout <= 0:
+                break
+        for actor in self._actors:
+            if actor.is_alive():
+                actor.terminate()
+            actor.join()
+        self._actors = []
+        self._stop_event = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def receive_rollouts(self):
+        rollouts = []
+        while len(rollouts) < self.rollouts_per_update:
+            try:
+                rollouts.append(self._rollout_queue.get(timeout=QUEUE_POLL_INTERVAL))
+            except queue.Empty:
+                if not any(actor.is_alive() for actor in self._actors):
+                    raise RuntimeError('All actor processes have exited')
+        return rollouts
+
+    def calculate_loss(self, rollouts):
+        action_logarithms, values, entropies = [], [], []
+        vs, pg_advantages = [], []
+        for rollout in rollouts:
+            states = torch.from_numpy(rollout['states']).to(device)
+            actions = torch.from_numpy(rollout['actions']).to(device)
+            behaviour_logarithms = torch.from_numpy(rollout['action_logarithms']).to(device)
+            rewards = torch.from_numpy(rollout['rewards']).to(device)
+
+            rollout_logarithms, rollout_values, rollout_entropy = self.net.evaluate(
+                states, actions)
+            rollout_values = rollout_values.view(-1)
+
+            if rollout['done']:
+                bootstrap_value = 0.0
+            else:
+                with torch.no_grad():
+                    bootstrap_value = self.net.value(
+                        torch.from_numpy(rollout['bootstrap_state']).to(device))
+            rollout_vs, rollout_advantages = vtrace(
+                behaviour_logarithms, rollout_logarithms.detach(), rewards,
+                rollout_values.detach(), bootstrap_value, gamma=self.gamma,
+                rho_bar=self.rho_bar, c_bar=self.c_bar)
+
+            action_logarithms.append(rollout_logarithms.view(-1))
+            values.append(rollout_values)
+            entropies.append(rollout_entropy.view(-1))
+            vs.append(rollout_vs)
+            pg_advantages.append(rollout_advantages)
+
+        action_logarithms = torch.cat(action_logarithms)
+        values = torch.cat(values)
+        entropy = torch.cat(entropies)
+        vs = torch.cat(vs)
+        pg_advantages = torch.cat(pg_advantages)
+
+        actor_loss = -(action_logarithms * pg_advantages).mean()
+        critic_loss = 0.5 * (vs - values).pow(2).mean()
+        return actor_loss + critic_loss + self.beta_entropy * entropy.mean()
+
+    def train(self, number_of_updates=1):
+        if not self._actors:
+            self.start()
+
+        reward = 0.0
+        samples = 0
+        policy_lag = 0
+        start = time.perf_counter()
+        with self.telemetry.iteration():
+            for _ in range(number_of_updates):
+                with self.telemetry.stage('receive_rollouts'):
+                    rollouts = self.receive_rollouts()
+                with self.telemetry.stage('calculate_loss'):
+                    loss = self.calculate_loss(rollouts)
+
+                with self.telemetry.stage('backward'):
+                    self.optimizer.zero_grad()
+                    loss.backward()
+                    if self.max_grad_norm is not None:
+                        torch.nn.utils.clip_grad_norm_(
+                            self.net.parameters(), self.max_grad_norm)
+                with self.telemetry.stage('optimizer_step'):
+                    self.optimizer.step()
+                with self.telemetry.stage('publish_weights'):
+                    version = self.shared_weights.publish(self.net)
+
+                for rollout in rollouts:
+                    rollout_reward = float(rollout['rewards'].sum())
+                    reward += rollout_reward
+                    samples += len(rollout['rewards'])
+                    self.total_samples += len(rollout['rewards'])
+                    self.samples_to_reward.append((self.total_samples, rollout_reward))
+                    policy_lag = max(policy_lag, version - 1 - rollout['version'])
+                    self.telemetry.count('env_steps', len(rollout['rewards']))
+                self.telemetry.count('updates')
+                self.total_updates += 1
+
+            if self.telemetry.enabled:
+                self.telemetry.gauge('reward', reward)
+                self.telemetry.gauge('max_policy_lag', policy_lag)
+                self.telemetry.gauge('tensor_bytes', tensor_bytes(self.net, self.optimizer))
+
+        elapsed = time.perf_counter() - start
+        self.last_update_info = {
+            'updates': number_of_updates,
+            'samples': samples,
+            'max_policy_lag': policy_lag,
+            'updates_per_second': number_of_updates / elapsed if elapsed > 0 else float('inf'),
+            'samples_per_second': samples / elapsed if elapsed > 0 else float('inf'),
+        }
+        return reward, self.net
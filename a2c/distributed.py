@@ -0,0 +1,107 @@
+import os
+import random
+
+import numpy as np
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.nn.parallel import DistributedDataParallel
+
+try:
+    from .a2c import A2CTrainer
+except ImportError:
+    from a2c import A2CTrainer
+
+
+def seed_rank(seed, rank):
+    """Give every rank its own torch, NumPy and map generation stream."""
+    rank_seed = seed + rank
+    random.seed(rank_seed)
+    np.random.seed(rank_seed)
+    torch.manual_seed(rank_seed)
+    return rank_seed
+
+
+def init_distributed(rank, world_size, master_addr='127.0.0.1', master_port=29500,
+                     backend='gloo'):
+    os.environ.setdefault('MASTER_ADDR', master_addr)
+    os.environ.setdefault('MASTER_PORT', str(master_port))
+    dist.init_process_group(backend, rank=rank, world_size=world_size)
+
+
+def _run_rank(rank, world_size, worker, master_addr, master_port, args):
+    init_distributed(rank, world_size, master_addr, master_port)
+    try:
+        worker(rank, world_size, *args)
+    finally:
+        dist.destroy_process_group()
+
+
+def launch(worker, world_size, *args, master_addr='127.0.0.1', master_port=29500):
+    """Run worker(rank, world_size, *args) in world_size local processes.
+
+    Every process has the default process group initialised before worker is
+    called. For several nodes start one launcher per node and set MASTER_ADDR,
+    MASTER_PORT and the global rank through the environment instead.
+    """
+    mp.spawn(_run_rank, args=(world_size, worker, master_addr, master_port, args),
+             nprocs=world_size, join=True)
+
+
+class DistributedA2CTrainer(A2CTrainer):
+    """Data-parallel A2CTrainer, one instance per rank.
+
+    Every rank collects rollouts from its own environment and computes the
+    losses locally, gradients are averaged by DistributedDataParallel. The
+    process group has to be initialised before the trainer is created.
+    """
+
+    def __init__(self, net, out_num, environment, batch_size,
+                 gamma, beta_entropy, learning_rate, clip_size, seed=0, **kwargs):
+        self.rank = dist.get_rank()
+        self.world_size = dist.get_world_size()
+        self.seed = seed_rank(seed, self.rank)
+
+        super(DistributedA2CTrainer, self).__init__(
+            net, out_num, environment, batch_size,
+            gamma, beta_entropy, learning_rate, clip_size, **kwargs)
+
+        # the vision part only produces states during collection and never
+        # receives gradients from the update
+        self.ddp_net = DistributedDataParallel(
+            self.new_net, find_unused_parameters=True)
+        # DistributedDataParallel broadcast rank 0 weights into new_net
+        self.net.load_state_dict(self.new_net.state_dict())
+
+        self.global_total_samples = 0
+
+    def evaluate(self, states, actions):
+        return self.ddp_net(states, actions)
+
+    def minibatches(self, number_of_samples):
+        # every rank has to take the same number of optimizer steps, otherwise
+        # the gradient all-reduce of the longest rollout never completes
+        minibatch_size = self.minibatch_size or number_of_samples
+        number_of_minibatches = torch.tensor(
+            [-(-number_of_samples // minibatch_size)])
+        dist.all_reduce(number_of_minibatches, op=dist.ReduceOp.MIN)
+
+        minibatches = super(DistributedA2CTrainer, self).minibatches(number_of_samples)
+        for _, indices in zip(range(number_of_minibatches.item()), minibatches):
+            yield indices
+
+    def approximate_kl(self, ratio, log_ratio):
+        # early stopping has to be decided identically on every rank
+        approx_kl = torch.tensor(
+            [super(DistributedA2CTrainer, self).approximate_kl(ratio, log_ratio)])
+        dist.all_reduce(approx_kl)
+        return approx_kl.item() / self.world_size
+
+    def train(self, make_video=False):
+        reward, net, images = super(DistributedA2CTrainer, self).train(make_video)
+
+        totals = torch.tensor([reward, len(self.data.rewards)], dtype=torch.float64)
+        dist.all_reduce(totals)
+        self.global_total_samples += int(totals[1].item())
+        mean_reward = totals[0].item() / self.world_size
+        return mean_reward, net, images
@@ -1,10 +1,15 @@
 import torch
 
+try:
+    from .telemetry import Telemetry
+except ImportError:
+    from telemetry import Telemetry
+
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
 
 class DataCollector:
-    def __init__(self, net, out_num, environment, gamma):
+    def __init__(self, net, out_num, environment, gamma, telemetry=None):
         self.net = net.to(device)
         self.out_num = out_num
         self.env = environment
@@ -16,6 +21,10 @@ class DataCollector:
         self.actions = []
         self.Qval = 0
         self.images = []
+        # where the last rollout stopped, for bootstrapping a truncated one
+        self.last_observation = None
+        self.done = False
+        self.telemetry = telemetry or Telemetry(enabled=False)
 
     def clear_previous_batch_data(self):
         self.np_Qvals = []
@@ -25,6 +34,8 @@ class DataCollector:
         self.actions = []
         self.Qval = 0
         self.images = []
+        self.last_observation = None
+        self.done = False
 
     def calculate_qvals(self):
         Qval = 0
@@ -35,26 +46,34 @@ class DataCollector:
         return torch.tensor(Qvals).to(device)
 
     def collect_data_for(self, batch_size, make_video=False):
-        current_state = self.env.reset()
+        with self.telemetry.stage('env_reset'):
+            current_state = self.env.reset()
         for simulation_step in range(batch_size):
 
             if self.render:
                 self.env.render()
 
-            action = self.net.pick_action(
-                current_state['picture'], current_state['thresholds'], self)
-            observation, reward, done, _ = self.env.step(action)
+            with self.telemetry.stage('pick_action'):
+                action = self.net.pick_action(
+                    current_state['picture'], current_state['thresholds'], self)
+            with self.telemetry.stage('env_step'):
+                observation, reward, done, _ = self.env.step(action)
+            self.telemetry.count('env_steps')
             self.rewards.append(reward)
 
             if make_video:
                 self.images.append(observation['picture'])
 
             current_state = observation
+            self.last_observation = observation
+            self.done = done
             if done or simulation_step == batch_size - 1:
                 self.Qval = self.calculate_qvals()
                 break
 
     def stack_data(self):
-        self.states = torch.stack(self.states).to(device)
+        # the rollout is reused for several optimisation epochs, so it must not
+        # keep the graph of the collecting network alive
+        self.states = torch.stack(self.states).detach().to(device)
         self.actions = torch.stack(self.actions).to(device)
-        self.action_logarithms = torch.stack(self.action_logarithms).to(device)
+        self.action_logarithms = torch.stack(self.action_logarithms).detach().to(device)
@@ -0,0 +1,25 @@
+class SharedWeights:
+    """Network weights kept in shared memory and published with a version counter.
+
+    The learner calls publish() after each update; actors call load_into()
+    before each rollout and only copy the weights when the version changed.
+    """
+
+    def __init__(self, net, context):
+        self.tensors = {name: tensor.detach().cpu().clone().share_memory_()
+                        for name, tensor in net.state_dict().items()}
+        self.version = context.Value('l', 0)
+
+    def publish(self, net):
+        with self.version.get_lock():
+            for name, tensor in net.state_dict().items():
+                self.tensors[name].copy_(tensor.detach())
+            self.version.value += 1
+            return self.version.value
+
+    def load_into(self, net, known_version=-1):
+        if self.version.value == known_version:
+            return known_version
+        with self.version.get_lock():
+            net.load_state_dict(self.tensors)
+            return self.version.value
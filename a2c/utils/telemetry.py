@@ -0,0 +1,219 @@
+import collections
+import contextlib
+import json
+import os
+import sys
+import time
+
+import torch
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# shared by every disabled stage, nullcontext can be entered any number of times
+_DISABLED = contextlib.nullcontext()
+
+
+def peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def tensor_bytes(*objects):
+    """Bytes held by the tensors of modules, optimizers, dicts, lists and tensors.
+
+    Storages shared by several tensors, like the views of a stacked rollout,
+    are counted once.
+    """
+    storages = {}
+
+    def visit(value):
+        if isinstance(value, torch.Tensor):
+            storage = value.untyped_storage()
+            storages[storage.data_ptr()] = storage.nbytes()
+        elif isinstance(value, torch.nn.Module):
+            for tensor in value.state_dict(keep_vars=True).values():
+                visit(tensor)
+        elif isinstance(value, torch.optim.Optimizer):
+            for state in value.state.values():
+                visit(state)
+        elif isinstance(value, dict):
+            for item in value.values():
+                visit(item)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                visit(item)
+
+    for value in objects:
+        visit(value)
+    return sum(storages.values())
+
+
+class _Stage:
+    __slots__ = ('telemetry', 'name', 'start', 'record')
+
+    def __init__(self, telemetry, name):
+        self.telemetry = telemetry
+        self.name = name
+        self.record = None
+
+    def __enter__(self):
+        if self.telemetry.profiler is not None:
+            self.record = torch.profiler.record_function(self.name)
+            self.record.__enter__()
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        if self.telemetry.synchronize:
+            torch.cuda.synchronize()
+        elapsed = time.perf_counter() - self.start
+        self.telemetry.stage_seconds[self.name] += elapsed
+        self.telemetry.total_stage_seconds[self.name] += elapsed
+        if self.record is not None:
+            self.record.__exit__(*exc_info)
+
+
+class Telemetry:
+    """Per-stage wall-clock timers, throughput and memory of a training loop.
+
+    Trainers wrap every train() call in iteration() and the work inside it in
+    stage(name); count() adds to per-iteration counters like env_steps and
+    updates. After each iteration a record is appended to jsonl_path and the
+    cumulative metrics are rewritten to prometheus_path, in the textfile
+    format the node exporter collects. Iterations listed in
+    profile_iterations run under torch.profiler and leave a Chrome trace in
+    trace_dir, with the stages as labelled ranges.
+
+    A disabled Telemetry hands out one shared no-op context, so the
+    instrumented code costs a method call per stage.
+    """
+
+    def __init__(self, enabled=True, jsonl_path=None, prometheus_path=None,
+                 profile_iterations=(), trace_dir='.', prefix='swarmball_a2c',
+                 synchronize=None):
+        self.enabled = enabled
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.profile_iterations = set(profile_iterations)
+        self.trace_dir = trace_dir
+        self.prefix = prefix
+        # CUDA kernels run asynchronously, without a sync their time lands in
+        # whichever stage waits for them next
+        self.synchronize = torch.cuda.is_available() if synchronize is None else synchronize
+        self.profiler = None
+
+        self.iteration_index = 0
+        self.stage_seconds = collections.defaultdict(float)
+        self.counters = collections.defaultdict(int)
+        self.gauges = {}
+        self.total_stage_seconds = collections.defaultdict(float)
+        self.total_counters = collections.defaultdict(int)
+        self.total_seconds = 0.0
+        self.last_record = {}
+
+    def stage(self, name):
+        if not self.enabled:
+            return _DISABLED
+        return _Stage(self, name)
+
+    def count(self, name, value=1):
+        if self.enabled:
+            self.counters[name] += value
+
+    def gauge(self, name, value):
+        if self.enabled:
+            self.gauges[name] = value
+
+    def iteration(self):
+        if not self.enabled:
+            return _DISABLED
+        return self._iteration()
+
+    @contextlib.contextmanager
+    def _iteration(self):
+        self.stage_seconds.clear()
+        self.counters.clear()
+        self.gauges.clear()
+
+        profile = self.iteration_index in self.profile_iterations
+        if profile:
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            self.profiler = torch.profiler.profile(
+                activities=activities, record_shapes=True, profile_memory=True)
+            self.profiler.__enter__()
+
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            elapsed = time.perf_counter() - start
+            if profile:
+                self.profiler.__exit__(None, None, None)
+                os.makedirs(self.trace_dir, exist_ok=True)
+                self.profiler.export_chrome_trace(os.path.join(
+                    self.trace_dir, 'iteration_{}.json'.format(self.iteration_index)))
+                self.profiler = None
+            self._end_iteration(elapsed)
+
+    def _end_iteration(self, elapsed):
+        self.total_seconds += elapsed
+        for name, value in self.counters.items():
+            self.total_counters[name] += value
+
+        record = {
+            'iteration': self.iteration_index,
+            'timestamp': time.time(),
+            'iteration_seconds': elapsed,
+            'stages': dict(self.stage_seconds),
+            'counters': dict(self.counters),
+            'peak_rss_bytes': peak_rss_bytes(),
+        }
+        for name, value in self.counters.items():
+            record[name + '_per_second'] = value / elapsed if elapsed > 0 else float('inf')
+        if torch.cuda.is_available():
+            record['cuda_max_allocated_bytes'] = torch.cuda.max_memory_allocated()
+        record.update(self.gauges)
+
+        self.last_record = record
+        self.iteration_index += 1
+        if self.jsonl_path is not None:
+            with open(self.jsonl_path, 'a') as file:
+                file.write(json.dumps(record) + '\n')
+        if self.prometheus_path is not None:
+            self.write_prometheus(self.prometheus_path)
+
+    def prometheus_lines(self):
+        prefix = self.prefix
+        lines = ['# TYPE {}_iterations_total counter'.format(prefix),
+                 '{}_iterations_total {}'.format(prefix, self.iteration_index),
+                 '# TYPE {}_seconds_total counter'.format(prefix),
+                 '{}_seconds_total {}'.format(prefix, self.total_seconds),
+                 '# TYPE {}_stage_seconds_total counter'.format(prefix)]
+        lines += ['{}_stage_seconds_total{{stage="{}"}} {}'.format(prefix, name, seconds)
+                  for name, seconds in sorted(self.total_stage_seconds.items())]
+        for name, value in sorted(self.total_counters.items()):
+            lines += ['# TYPE {}_{}_total counter'.format(prefix, name),
+                      '{}_{}_total {}'.format(prefix, name, value)]
+
+        # gauges describe the last iteration
+        for name, value in sorted(self.last_record.items()):
+            if name in ('iteration', 'timestamp') or not isinstance(value, (int, float)) \
+                    or isinstance(value, bool):
+                continue
+            lines += ['# TYPE {}_{} gauge'.format(prefix, name),
+                      '{}_{} {}'.format(prefix, name, value)]
+        return lines
+
+    def write_prometheus(self, path):
+        # written aside and renamed so the collector never reads half a file
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'w') as file:
+            file.write('\n'.join(self.prometheus_lines()) + '\n')
+        os.replace(temporary_path, path)
@@ -0,0 +1,32 @@
+import torch
+
+
+def vtrace(behaviour_log_probs, target_log_probs, rewards, values,
+           bootstrap_value, gamma, rho_bar=1.0, c_bar=1.0):
+    """V-trace targets and policy gradient advantages for a single rollout.
+
+    Corrects for the lag between the policy that collected the rollout
+    (behaviour) and the one being trained (target) with truncated importance
+    weights, as in Espeholt et al., "IMPALA" (2018). All inputs are 1-D over
+    time except bootstrap_value, the value estimate after the last step.
+    """
+    with torch.no_grad():
+        rhos = torch.exp(target_log_probs - behaviour_log_probs)
+        clipped_rhos = torch.clamp(rhos, max=rho_bar)
+        cs = torch.clamp(rhos, max=c_bar)
+
+        bootstrap_value = torch.as_tensor(
+            bootstrap_value, dtype=values.dtype, device=values.device).view(1)
+        next_values = torch.cat([values[1:], bootstrap_value])
+        deltas = clipped_rhos * (rewards + gamma * next_values - values)
+
+        vs_minus_values = torch.zeros_like(values)
+        accumulator = torch.zeros_like(bootstrap_value[0])
+        for t in reversed(range(len(values))):
+            accumulator = deltas[t] + gamma * cs[t] * accumulator
+            vs_minus_values[t] = accumulator
+        vs = values + vs_minus_values
+
+        next_vs = torch.cat([vs[1:], bootstrap_value])
+        pg_advantages = clipped_rhos * (rewards + gamma * next_vs - values)
+    return vs, pg_advantages
@@ -0,0 +1,66 @@
+"""Samples/sec of DistributedA2CTrainer against world size on one machine.
+
+Run from the repository root:
+    python -m benchmarks.distributed_scaling --max-world-size 4
+"""
+import argparse
+import os
+import time
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+from a2c.distributed import DistributedA2CTrainer, launch
+from environment.swarmball_env import SwarmBall
+from policy_network.HiveNet import HiveNet
+
+NUMBER_OF_CLUSTERS = 3
+
+
+def benchmark_rank(rank, world_size, iterations, batch_size, results):
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    torch.set_num_threads(1)
+
+    env = SwarmBall(number_of_clusters=NUMBER_OF_CLUSTERS)
+    net = HiveNet(kernel_size=5, stride=2, num_of_thresholds=NUMBER_OF_CLUSTERS)
+    trainer = DistributedA2CTrainer(net, 2 ** NUMBER_OF_CLUSTERS, env, batch_size,
+                                    gamma=0.99, beta_entropy=0.01,
+                                    learning_rate=1e-3, clip_size=0.2)
+
+    trainer.train()  # warm up
+    dist.barrier()
+    start = time.perf_counter()
+    samples = trainer.global_total_samples
+    for _ in range(iterations):
+        trainer.train()
+    dist.barrier()
+    elapsed = time.perf_counter() - start
+
+    if rank == 0:
+        results.put((world_size, (trainer.global_total_samples - samples) / elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--max-world-size', type=int, default=os.cpu_count())
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=128)
+    args = parser.parse_args()
+
+    results = mp.get_context('spawn').SimpleQueue()
+    world_size = 1
+    baseline = None
+    print('world_size  samples/sec  speedup')
+    while world_size <= args.max_world_size:
+        launch(benchmark_rank, world_size, args.iterations, args.batch_size, results,
+               master_port=29500 + world_size)
+        _, samples_per_second = results.get()
+        baseline = baseline or samples_per_second
+        print('{:>10}  {:>11.1f}  {:>7.2f}'.format(
+            world_size, samples_per_second, samples_per_second / baseline))
+        world_size *= 2
+
+
+if __name__ == '__main__':
+    main()
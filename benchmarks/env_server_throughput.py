@@ -0,0 +1,100 @@
+"""Latency and throughput of the remote env server against in-process stepping.
+
+Run from the repository root:
+    python -m benchmarks.env_server_throughput --envs 8 --steps 200
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from environment.remote.client import EnvClient
+from environment.swarmball_env import SwarmBall
+
+NUMBER_OF_CLUSTERS = 3
+
+
+def random_actions(count):
+    return np.random.randint(0, 2, size=(count, NUMBER_OF_CLUSTERS), dtype=np.uint8)
+
+
+def benchmark_in_process(number_of_envs, steps):
+    envs = [SwarmBall(number_of_clusters=NUMBER_OF_CLUSTERS) for _ in range(number_of_envs)]
+    for env in envs:
+        env.reset()
+    start = time.perf_counter()
+    for _ in range(steps):
+        for env, action in zip(envs, random_actions(number_of_envs)):
+            env.step(action)
+    return number_of_envs * steps / (time.perf_counter() - start)
+
+
+async def benchmark_remote(address, number_of_envs, steps, pipeline_depth):
+    env_ids = np.arange(number_of_envs)
+    groups = np.array_split(env_ids, pipeline_depth)
+    latencies = []
+    async with EnvClient(address) as client:
+        await client.reset(env_ids)
+        start = time.perf_counter()
+        in_flight = [(client.step_async(group, random_actions(len(group))), time.perf_counter())
+                     for group in groups]
+        for step in range(steps):
+            for index, group in enumerate(groups):
+                request_id, sent = in_flight[index]
+                await client.step_wait(request_id)
+                latencies.append(time.perf_counter() - sent)
+                if step < steps - 1:
+                    in_flight[index] = (client.step_async(group, random_actions(len(group))),
+                                        time.perf_counter())
+        elapsed = time.perf_counter() - start
+    return number_of_envs * steps / elapsed, np.median(latencies), np.percentile(latencies, 99)
+
+
+async def wait_for_server(address, timeout=60.0):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            async with EnvClient(address):
+                return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--envs', type=int, default=8)
+    parser.add_argument('--steps', type=int, default=200)
+    parser.add_argument('--pipeline-depths', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    address = os.path.join(tempfile.mkdtemp(), 'swarmball.sock')
+    server = subprocess.Popen([sys.executable, '-m', 'environment.remote.server',
+                               '--envs', str(args.envs),
+                               '--clusters', str(NUMBER_OF_CLUSTERS),
+                               '--unix', address])
+    try:
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(wait_for_server(address))
+
+        print('in-process          {:>9.1f} steps/sec'.format(
+            benchmark_in_process(args.envs, args.steps)))
+        for depth in args.pipeline_depths:
+            throughput, median, p99 = loop.run_until_complete(
+                benchmark_remote(address, args.envs, args.steps, depth))
+            print('remote, depth {:<5} {:>9.1f} steps/sec  latency p50 {:.2f} ms  p99 {:.2f} ms'.format(
+                depth, throughput, 1000 * median, 1000 * p99))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Compare the NumPy physics backend with pymunk, statistically and in speed.
+
+Runs the same seeded episodes (same terrain, same bot placement, same random
+threshold commands) with both backends and compares the distributions of the
+outcomes with a two-sample Kolmogorov-Smirnov test. A high p-value only
+means no difference was found: differences in the CDFs smaller than the
+printed detectable KS statistic go unnoticed at that episode count. Then
+measures world steps/sec of the NumPy backend for several batch sizes
+against pymunk. scipy is only needed by this benchmark.
+
+Run from the repository root:
+    python -m benchmarks.physics_backend_validation --episodes 200 --steps 400
+"""
+import argparse
+import os
+import random
+import time
+
+import numpy as np
+from scipy.stats import ks_2samp
+
+from environment.simulation.numpy_simulation import NumpySwarmBallSimulation
+from environment.simulation.simulation import SwarmBallSimulation
+
+NUMBER_OF_CLUSTERS = 3
+ACCELERATION_FACTOR = 0.25
+MAX_THRESHOLD_VELOCITY = 10
+
+
+def run_episode(sim, seed, steps):
+    """Drive the thresholds like SwarmBall.step does, with seeded random actions"""
+    random.seed(seed)
+    sim.reset()
+    commands = np.random.RandomState(seed)
+    start_x, start_y = sim.goal_position()
+    bots = sim.bots_alive()
+    velocity = np.zeros(NUMBER_OF_CLUSTERS)
+    for _ in range(steps):
+        action = commands.randint(0, 2, size=NUMBER_OF_CLUSTERS)
+        velocity = np.clip(velocity + (2 * action - 1) * ACCELERATION_FACTOR,
+                           -MAX_THRESHOLD_VELOCITY, MAX_THRESHOLD_VELOCITY)
+        for i, position in enumerate(sim.threshold_positions()):
+            sim.update_thresholds_position(i, position + velocity[i])
+        sim.step()
+    end_x, end_y = sim.goal_position()
+    return {'goal displacement x': end_x - start_x,
+            'goal displacement y': end_y - start_y,
+            'bots lost': bots - sim.bots_alive()}
+
+
+def steps_per_second(sim, steps):
+    random.seed(0)
+    sim.reset()
+    start = time.perf_counter()
+    for _ in range(steps):
+        sim.step()
+    return getattr(sim, 'number_of_worlds', 1) * steps / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--episodes', type=int, default=200)
+    parser.add_argument('--steps', type=int, default=400)
+    parser.add_argument('--worlds', type=int, nargs='+', default=[1, 16, 64, 256])
+    args = parser.parse_args()
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+
+    backends = {'pymunk': SwarmBallSimulation(NUMBER_OF_CLUSTERS),
+                'numpy': NumpySwarmBallSimulation(NUMBER_OF_CLUSTERS)}
+    results = {name: [run_episode(sim, seed, args.steps) for seed in range(args.episodes)]
+               for name, sim in backends.items()}
+
+    print('{:<22} {:>16} {:>16} {:>6} {:>8}'.format('metric', 'pymunk', 'numpy', 'KS', 'p'))
+    for metric in results['pymunk'][0]:
+        samples = {name: np.array([episode[metric] for episode in episodes])
+                   for name, episodes in results.items()}
+        statistic, p_value = ks_2samp(samples['pymunk'], samples['numpy'])
+        print('{:<22} {:>16} {:>16} {:>6.3f} {:>8.3f}'.format(
+            metric,
+            '{:.1f} +- {:.1f}'.format(samples['pymunk'].mean(), samples['pymunk'].std()),
+            '{:.1f} +- {:.1f}'.format(samples['numpy'].mean(), samples['numpy'].std()),
+            statistic, p_value))
+    # two-sided KS critical value at alpha = 0.05 for equal sample sizes
+    print('detectable KS statistic at p < 0.05: {:.3f}'.format(1.358 * np.sqrt(2.0 / args.episodes)))
+
+    print()
+    print('pymunk             {:>10.1f} world steps/sec'.format(
+        steps_per_second(backends['pymunk'], args.steps)))
+    for worlds in args.worlds:
+        sim = NumpySwarmBallSimulation(NUMBER_OF_CLUSTERS, number_of_worlds=worlds)
+        print('numpy, {:>4} worlds {:>10.1f} world steps/sec'.format(
+            worlds, steps_per_second(sim, args.steps)))
+
+
+if __name__ == '__main__':
+    main()
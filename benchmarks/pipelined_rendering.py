@@ -0,0 +1,140 @@
+"""Env steps/sec with rendering enabled, inline against the render thread.
+
+inline draws every picture inside step(). lagged returns the previous
+step's picture from step() and draws the current one on a render thread.
+--policy-ms adds a GIL-releasing pause per batch of steps, standing in for
+policy inference that drawing can hide behind.
+
+Also prints where an inline step spends its time and whether the render
+thread holds the GIL: the median time the main thread needs to wake up from
+a 0.5 ms sleep, idle and while frames are drawn in the background. A
+latency close to the draw time means drawing cannot overlap with Python
+code on the main thread, whatever the number of cores.
+
+Run from the repository root:
+    python -m benchmarks.pipelined_rendering --envs 4 --steps 200
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+
+import numpy as np
+import pygame
+
+from environment.simulation.utils import simulation_pygame_utils as pygame_utils
+from environment.simulation.utils.render_thread import RenderThread
+from environment.swarmball_env import PHYSICS_BACKENDS, RENDERING_MODES, SwarmBall
+
+NUMBER_OF_CLUSTERS = 3
+
+
+def benchmark(physics, rendering, number_of_envs, steps, policy_seconds):
+    envs = [SwarmBall(number_of_clusters=NUMBER_OF_CLUSTERS, physics=physics, rendering=rendering)
+            for _ in range(number_of_envs)]
+    for env in envs:
+        env.reset()
+    random_state = np.random.RandomState(0)
+    try:
+        start = time.perf_counter()
+        for _ in range(steps):
+            actions = random_state.randint(0, 2, size=(number_of_envs, NUMBER_OF_CLUSTERS))
+            for env, action in zip(envs, actions):
+                env.step(action)
+            if policy_seconds:
+                time.sleep(policy_seconds)
+        return number_of_envs * steps / (time.perf_counter() - start)
+    finally:
+        for env in envs:
+            env.close()
+
+
+def stage_times(physics, steps):
+    """Mean milliseconds per step of simulating, taking the snapshot, drawing and converting it"""
+    env = SwarmBall(number_of_clusters=NUMBER_OF_CLUSTERS, physics=physics)
+    env.reset()
+    surface = pygame.Surface(env.sim.screen_size)
+    random_state = np.random.RandomState(0)
+    totals = np.zeros(4)
+    for _ in range(steps):
+        times = [time.perf_counter()]
+        velocities = random_state.uniform(-env.v_max, env.v_max, size=NUMBER_OF_CLUSTERS)
+        for i, position in enumerate(env.sim.threshold_positions()):
+            env.sim.update_thresholds_position(i, position + velocities[i])
+        env.sim.step()
+        times.append(time.perf_counter())
+        snapshot = env.sim.snapshot()
+        times.append(time.perf_counter())
+        pygame_utils.draw_snapshot(surface, snapshot)
+        times.append(time.perf_counter())
+        pygame.image.tostring(surface, "RGB")
+        times.append(time.perf_counter())
+        totals += np.diff(times)
+    env.close()
+    return 1000 * totals / steps
+
+
+def wake_latency(samples=50):
+    latencies = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        time.sleep(0.0005)
+        latencies.append(time.perf_counter() - start)
+    return 1000 * statistics.median(latencies)
+
+
+def render_gil_latency(physics):
+    """Main thread wake latency in ms, idle and while a RenderThread draws frames"""
+    env = SwarmBall(number_of_clusters=NUMBER_OF_CLUSTERS, physics=physics)
+    env.reset()
+    snapshot = env.sim.snapshot()
+    renderer = RenderThread(env.sim.screen_size)
+    idle = wake_latency()
+    stop = threading.Event()
+
+    def feed():
+        while not stop.is_set():
+            renderer.submit(snapshot)
+            renderer.frame()
+
+    feeder = threading.Thread(target=feed)
+    feeder.start()
+    busy = wake_latency()
+    stop.set()
+    feeder.join()
+    renderer.close()
+    env.close()
+    return idle, busy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--envs', type=int, default=4)
+    parser.add_argument('--steps', type=int, default=200)
+    parser.add_argument('--policy-ms', type=float, default=0.0)
+    parser.add_argument('--physics', nargs='+', default=list(PHYSICS_BACKENDS), choices=list(PHYSICS_BACKENDS))
+    args = parser.parse_args()
+
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    print('{} cores, pygame {}'.format(cores, pygame.version.ver))
+    print('{:<8} {:>12} {:>12} {:>12} {:>12} {:>16} {:>16}'.format(
+        'physics', 'simulate ms', 'snapshot ms', 'draw ms', 'tostring ms', 'idle wake ms', 'drawing wake ms'))
+    for physics in args.physics:
+        times = stage_times(physics, args.steps)
+        idle, busy = render_gil_latency(physics)
+        print('{:<8} {:>12.2f} {:>12.2f} {:>12.2f} {:>12.2f} {:>16.2f} {:>16.2f}'.format(
+            physics, *times, idle, busy))
+
+    print('\n{:<8} {:<10} {:>12} {:>10}'.format('physics', 'rendering', 'steps/s', 'speedup'))
+    for physics in args.physics:
+        inline = None
+        for rendering in RENDERING_MODES:
+            rate = benchmark(physics, rendering, args.envs, args.steps, args.policy_ms / 1000)
+            inline = inline or rate
+            print('{:<8} {:<10} {:>12.1f} {:>9.2f}x'.format(physics, rendering, rate, rate / inline))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Map interpolation time of the NumPy spline engine against scipy, per Difficulty.
+
+For every difficulty the same random map points are interpolated by the old
+scipy path (splprep/splev plus the zipped segment list it used to build),
+by the spline engine one segment at a time and by the engine in one batch.
+Also reports the largest distance between the scipy and the engine points
+and how many points a given --point-spacing would produce instead.
+scipy is only needed by this benchmark.
+
+Run from the repository root:
+    python -m benchmarks.spline_interpolation --segments 64 --point-spacing 5
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+from scipy.interpolate import splev, splprep
+
+from environment.simulation.utils import generate_map as gen
+from environment.simulation.utils import spline
+
+
+def scipy_interpolate(game_map):
+    # the random points, get_X_list returns the interpolated ones once a map is interpolated
+    x_list = [point.x for point in game_map.points_before_interpolation]
+    y_list = [point.y for point in game_map.points_before_interpolation]
+    tck, _ = splprep([x_list, y_list], s=0, k=gen.INTERPOLATION_K)
+    x_array, y_array = splev(np.linspace(0, 1, game_map.resolution[0]), tck, der=0)
+    map_points = np.vstack((x_array + game_map.x_offset, y_array)).T
+    segments = list(zip(map_points[:-1], map_points[1:]))
+    return map_points, segments
+
+
+def best_time(function, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--segments', type=int, default=64, help='map segments per difficulty')
+    parser.add_argument('--segment-size', type=int, nargs=2, default=(600, 600))
+    parser.add_argument('--point-spacing', type=float, default=5.0)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    print('{:<12} {:>8} {:>12} {:>12} {:>12} {:>10} {:>10} {:>14}'.format(
+        'difficulty', 'points', 'scipy ms', 'numpy ms', 'batch ms', 'speedup', 'max diff', 'spaced points'))
+    for difficulty in gen.Difficulty:
+        random.seed(int(difficulty))
+        maps = [gen.prepare_map(diff_level=difficulty, y_offset=300.0, resolution=tuple(args.segment_size))
+                for _ in range(args.segments)]
+        controls = [np.array(game_map.points_before_interpolation) for game_map in maps]
+
+        scipy_time = best_time(lambda: [scipy_interpolate(game_map) for game_map in maps], args.repeats)
+        single_time = best_time(lambda: [gen.interpolate_maps([game_map]) for game_map in maps], args.repeats)
+        batch_time = best_time(lambda: gen.interpolate_maps(maps), args.repeats)
+
+        difference = max(np.abs(scipy_interpolate(game_map)[0] - game_map.map_points).max()
+                         for game_map in maps)
+        spaced = np.mean(spline.sample_counts(controls, args.point_spacing))
+        print('{:<12} {:>8.1f} {:>12.2f} {:>12.2f} {:>12.2f} {:>9.1f}x {:>10.1e} {:>14.1f}'.format(
+            difficulty.name, np.mean([len(points) for points in controls]),
+            1000 * scipy_time / args.segments, 1000 * single_time / args.segments,
+            1000 * batch_time / args.segments, scipy_time / batch_time, difference, spaced))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Time from starting a worker process to its first env reset(), per start method.
+
+Workers are started one at a time, each builds a SwarmBall, resets it and
+reports back. With forkserver the first worker also pays for starting the
+server and its preloads, the later ones are forked with everything already
+imported.
+
+Run from the repository root:
+    python -m benchmarks.worker_startup --workers 5
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from environment.worker_factory import worker_context
+
+START_METHODS = ('spawn', 'forkserver')
+
+
+def first_reset(ready, physics):
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    from environment.swarmball_env import SwarmBall
+    SwarmBall(physics=physics).reset()
+    ready.put(os.getpid())
+
+
+def startup_times(start_method, workers, physics):
+    context = worker_context(start_method)
+    ready = context.SimpleQueue()
+    times = []
+    for _ in range(workers):
+        start = time.perf_counter()
+        worker = context.Process(target=first_reset, args=(ready, physics))
+        worker.start()
+        ready.get()
+        times.append(time.perf_counter() - start)
+        worker.join()
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=5)
+    parser.add_argument('--physics', default='pymunk', choices=['pymunk', 'numpy'])
+    args = parser.parse_args()
+
+    print('{:<12} {:>12} {:>14}'.format('start method', 'first s', 'later mean s'))
+    for start_method in START_METHODS:
+        times = startup_times(start_method, args.workers, args.physics)
+        later = np.mean(times[1:]) if len(times) > 1 else float('nan')
+        print('{:<12} {:>12.3f} {:>14.3f}'.format(start_method, times[0], later))
+
+
+if __name__ == '__main__':
+    main()
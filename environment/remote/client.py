@@ -0,0 +1,118 @@
+import asyncio
+import itertools
+import logging
+
+try:
+    from . import protocol
+except ImportError:
+    import protocol
+
+logger = logging.getLogger(__name__)
+
+
+class RemoteEnvError(Exception):
+    pass
+
+
+class EnvClient:
+    """asyncio client of EnvServer.
+
+    step_async only sends the request, so several batches can be in flight at
+    once; step_wait collects the results of one of them. Observations have
+    the same layout as SwarmBall's, with the frame as a memoryview of the
+    received message.
+    """
+
+    def __init__(self, address):
+        self.address = address
+        self._reader = None
+        self._writer = None
+        self._receiver = None
+        self._pending = {}
+        self._request_ids = itertools.count()
+        # set once the receiver stops, later requests fail with it right away
+        self._failure = None
+
+    async def connect(self):
+        if isinstance(self.address, str):
+            self._reader, self._writer = await asyncio.open_unix_connection(self.address)
+        else:
+            host, port = self.address
+            self._reader, self._writer = await asyncio.open_connection(host, port)
+        self._receiver = asyncio.ensure_future(self._receive())
+        return self
+
+    async def _receive(self):
+        try:
+            while True:
+                body = await protocol.read_message(self._reader)
+                opcode, request_id, results = protocol.decode_response(body)
+                future = self._pending.get(request_id)
+                if future is None:
+                    logger.warning('Dropping a response to unknown request %d: %s', request_id,
+                                   results if opcode == protocol.ERROR else 'opcode {}'.format(opcode))
+                elif opcode == protocol.ERROR:
+                    future.set_exception(RemoteEnvError(results))
+                else:
+                    future.set_result(results)
+        except (asyncio.IncompleteReadError, ConnectionError) as error:
+            self._fail_pending(RemoteEnvError('Connection lost: {!r}'.format(error)))
+        except asyncio.CancelledError:
+            self._fail_pending(RemoteEnvError('Client closed'))
+            raise
+        except Exception as error:
+            self._fail_pending(RemoteEnvError('Receiving responses failed: {!r}'.format(error)))
+
+    def _fail_pending(self, error):
+        self._failure = error
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    def _send(self, opcode, env_ids, actions=None):
+        request_id = next(self._request_ids) & 0xFFFFFFFF
+        future = self._pending[request_id] = asyncio.get_event_loop().create_future()
+        if self._failure is not None:
+            future.set_exception(self._failure)
+            return request_id
+        self._writer.write(protocol.encode_request(opcode, request_id, env_ids, actions))
+        return request_id
+
+    def reset_async(self, env_ids):
+        return self._send(protocol.RESET, env_ids)
+
+    def step_async(self, env_ids, actions):
+        return self._send(protocol.STEP, env_ids, actions)
+
+    async def _wait(self, request_id):
+        await self._writer.drain()
+        try:
+            return await self._pending[request_id]
+        finally:
+            del self._pending[request_id]
+
+    async def reset_wait(self, request_id):
+        return [observation for _, observation, _, _ in await self._wait(request_id)]
+
+    async def step_wait(self, request_id):
+        """Returns (observation, reward, done, info) for every env of the request."""
+        return [(observation, reward, done, {'env_id': env_id})
+                for env_id, observation, reward, done in await self._wait(request_id)]
+
+    async def reset(self, env_ids):
+        return await self.reset_wait(self.reset_async(env_ids))
+
+    async def step(self, env_ids, actions):
+        return await self.step_wait(self.step_async(env_ids, actions))
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._receiver is not None:
+            self._receiver.cancel()
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
@@ -0,0 +1,118 @@
+"""Binary wire format of the SwarmBall env server.
+
+Every message is a little-endian uint32 body length followed by the body.
+Request body:   opcode u8, request id u32, env count u32, env ids u32[count],
+                for STEP also action width u16 and actions u8[count, width].
+Response body:  opcode u8, request id u32, env count u32, then per env
+                env id u32, reward f64, done u8, threshold count u16,
+                thresholds f64[count], frame width u16, frame height u16,
+                RGB frame u8[height, width, 3].
+ERROR responses carry a utf-8 message instead of the env count.
+"""
+import struct
+
+import numpy as np
+
+RESET = 1
+STEP = 2
+ERROR = 255
+
+LENGTH = struct.Struct('<I')
+HEADER = struct.Struct('<BII')
+ACTION_WIDTH = struct.Struct('<H')
+RESULT_HEADER = struct.Struct('<IdBH')
+FRAME_HEADER = struct.Struct('<HH')
+
+ENV_IDS_DTYPE = np.dtype('<u4')
+THRESHOLDS_DTYPE = np.dtype('<f8')
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def _message(body_parts):
+    body_length = sum(len(part) for part in body_parts)
+    return b''.join([LENGTH.pack(body_length)] + body_parts)
+
+
+def encode_request(opcode, request_id, env_ids, actions=None):
+    env_ids = np.ascontiguousarray(env_ids, dtype=ENV_IDS_DTYPE)
+    parts = [HEADER.pack(opcode, request_id, len(env_ids)), env_ids.tobytes()]
+    if opcode == STEP:
+        actions = np.ascontiguousarray(actions, dtype=np.uint8).reshape(len(env_ids), -1)
+        parts += [ACTION_WIDTH.pack(actions.shape[1]), actions.tobytes()]
+    return _message(parts)
+
+
+def request_id_of(body):
+    """Request id of a request body, readable even if the rest of it is malformed."""
+    _, request_id, _ = HEADER.unpack_from(body)
+    return request_id
+
+
+def decode_request(body):
+    opcode, request_id, count = HEADER.unpack_from(body)
+    offset = HEADER.size
+    env_ids = np.frombuffer(body, dtype=ENV_IDS_DTYPE, count=count, offset=offset)
+    offset += env_ids.nbytes
+    actions = None
+    if opcode == STEP:
+        (width,) = ACTION_WIDTH.unpack_from(body, offset)
+        offset += ACTION_WIDTH.size
+        actions = np.frombuffer(body, dtype=np.uint8, count=count * width,
+                                offset=offset).reshape(count, width)
+    elif opcode != RESET:
+        raise ProtocolError('Unknown opcode {}'.format(opcode))
+    return opcode, request_id, env_ids, actions
+
+
+def encode_response(opcode, request_id, results):
+    """results is a list of (env_id, observation, reward, done)."""
+    parts = [HEADER.pack(opcode, request_id, len(results))]
+    for env_id, observation, reward, done in results:
+        thresholds = np.ascontiguousarray(observation['thresholds'], dtype=THRESHOLDS_DTYPE)
+        width, height = observation['frame_size']
+        parts += [RESULT_HEADER.pack(int(env_id), float(reward), bool(done), len(thresholds)),
+                  thresholds.tobytes(),
+                  FRAME_HEADER.pack(width, height),
+                  observation['picture']]
+    return _message(parts)
+
+
+def encode_error(request_id, message):
+    return _message([HEADER.pack(ERROR, request_id, 0), message.encode('utf-8')])
+
+
+def decode_response(body):
+    """Returns (opcode, request_id, results) with results like encode_response takes.
+
+    Frames are memoryviews into body, nothing is copied.
+    """
+    opcode, request_id, count = HEADER.unpack_from(body)
+    offset = HEADER.size
+    if opcode == ERROR:
+        return opcode, request_id, bytes(body[offset:]).decode('utf-8')
+
+    view = memoryview(body)
+    results = []
+    for _ in range(count):
+        env_id, reward, done, threshold_count = RESULT_HEADER.unpack_from(body, offset)
+        offset += RESULT_HEADER.size
+        thresholds = np.frombuffer(body, dtype=THRESHOLDS_DTYPE,
+                                   count=threshold_count, offset=offset)
+        offset += thresholds.nbytes
+        width, height = FRAME_HEADER.unpack_from(body, offset)
+        offset += FRAME_HEADER.size
+        frame_length = width * height * 3
+        picture = view[offset:offset + frame_length]
+        offset += frame_length
+        observation = {'picture': picture, 'thresholds': thresholds,
+                       'frame_size': (width, height)}
+        results.append((env_id, observation, reward, bool(done)))
+    return opcode, request_id, results
+
+
+async def read_message(reader):
+    (body_length,) = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+    return await reader.readexactly(body_length)
@@ -0,0 +1,142 @@
+import argparse
+import asyncio
+import concurrent.futures
+
+try:
+    from . import protocol
+    from ..swarmball_env import SwarmBall
+except ImportError:
+    import protocol
+    from swarmball_env import SwarmBall
+
+
+class EnvServer:
+    """Hosts SwarmBall instances and steps batches of them for remote clients.
+
+    Requests are read and answered on the event loop while the environments
+    are stepped on a single worker thread, so a client can keep several
+    requests in flight and the network round trips overlap with simulation.
+    The worker is single threaded because all simulations in one process
+    share the pygame display surface, it also keeps the requests for each env
+    in arrival order.
+    """
+
+    def __init__(self, env_factory, number_of_envs):
+        self.envs = [env_factory() for _ in range(number_of_envs)]
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._server = None
+
+    def _frame_size(self, env_id):
+        return self.envs[env_id].sim.screen_size
+
+    def _validate(self, env_ids, actions=None):
+        # checked for the whole batch up front, a request that fails half way
+        # would leave the client without the observations of the envs it stepped
+        for env_id in env_ids:
+            if not 0 <= env_id < len(self.envs):
+                raise ValueError('Unknown env id {}'.format(env_id))
+        if actions is None:
+            return
+        for env_id, action in zip(env_ids, actions):
+            if len(action) != self.envs[env_id].cluster_count:
+                raise ValueError('Env {} takes {} actions, got {}'.format(
+                    env_id, self.envs[env_id].cluster_count, len(action)))
+            if action.max(initial=0) > 1:
+                raise ValueError('Actions must be 0 or 1, got {}'.format(action.tolist()))
+
+    def _reset(self, env_ids):
+        self._validate(env_ids)
+        results = []
+        for env_id in env_ids:
+            observation = self.envs[env_id].reset()
+            observation['frame_size'] = self._frame_size(env_id)
+            results.append((env_id, observation, 0.0, False))
+        return results
+
+    def _step(self, env_ids, actions):
+        self._validate(env_ids, actions)
+        results = []
+        for env_id, action in zip(env_ids, actions):
+            observation, reward, done, _ = self.envs[env_id].step(action)
+            observation['frame_size'] = self._frame_size(env_id)
+            results.append((env_id, observation, reward, done))
+        return results
+
+    def _handle(self, body):
+        request_id = 0
+        try:
+            # read first, so the error reply to a malformed request still reaches its sender
+            request_id = protocol.request_id_of(body)
+            opcode, _, env_ids, actions = protocol.decode_request(body)
+            if opcode == protocol.RESET:
+                results = self._reset(env_ids)
+            else:
+                results = self._step(env_ids, actions)
+            return protocol.encode_response(opcode, request_id, results)
+        except Exception as error:
+            return protocol.encode_error(request_id, repr(error))
+
+    async def _respond(self, writer, body):
+        loop = asyncio.get_event_loop()
+        response = await loop.run_in_executor(self._executor, self._handle, body)
+        writer.write(response)
+        await writer.drain()
+
+    async def _serve_client(self, reader, writer):
+        pending = set()
+        try:
+            while True:
+                body = await protocol.read_message(reader)
+                task = asyncio.ensure_future(self._respond(writer, body))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if pending:
+                await asyncio.wait(pending)
+            writer.close()
+
+    async def start(self, address):
+        """address is a (host, port) tuple for TCP or a path for a Unix socket."""
+        if isinstance(address, str):
+            self._server = await asyncio.start_unix_server(self._serve_client, path=address)
+        else:
+            host, port = address
+            self._server = await asyncio.start_server(self._serve_client, host, port)
+        return self._server
+
+    async def serve_forever(self, address):
+        await self.start(address)
+        async with self._server:
+            await self._server.serve_forever()
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+        self._executor.shutdown(wait=True)
+        for env in self.envs:
+            env.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve SwarmBall environments over a socket.')
+    parser.add_argument('--envs', type=int, default=8)
+    parser.add_argument('--clusters', type=int, default=3)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5555)
+    parser.add_argument('--unix', help='serve on this Unix socket path instead of TCP')
+    args = parser.parse_args()
+
+    server = EnvServer(lambda: SwarmBall(number_of_clusters=args.clusters), args.envs)
+    address = args.unix or (args.host, args.port)
+    try:
+        asyncio.get_event_loop().run_until_complete(server.serve_forever(address))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,361 @@
+import math
+import random
+
+import numpy as np
+import pygame
+
+try:
+    from .utils import simulation_utils as utils
+    from .utils import simulation_numpy_utils as numpy_utils
+    from .utils import simulation_pymunk_utils as pymunk_utils
+    from .utils import simulation_pygame_utils as pygame_utils
+    from .utils import generate_map as gen
+except ImportError:
+    import utils.simulation_utils as utils
+    import utils.simulation_numpy_utils as numpy_utils
+    import utils.simulation_pymunk_utils as pymunk_utils
+    import utils.simulation_pygame_utils as pygame_utils
+    import utils.generate_map as gen
+
+NUMBER_OF_MAP_SEGMENTS = 3
+BOT_START_HEIGHT = 20
+MAX_DISTANCE_FROM_THRESHOLD = 100
+
+
+class NumpySwarmBallSimulation(object):
+    """SwarmBallSimulation with a vectorized NumPy physics backend.
+
+    Steps number_of_worlds independent worlds in lockstep, each holding the
+    same number of bots. Bots are circles rolling on a heightfield made of
+    the upper envelope of the generated map, the goal object is a box whose
+    corners collide with that heightfield. Collisions between bots, bots and
+    the box, and with the ground use the ELASTICITY/FRICTION coefficients of
+    the pymunk backend.
+
+    The single world interface matches SwarmBallSimulation, with an optional
+    world index; batched state is available as arrays over worlds.
+    """
+
+    def __init__(self,
+                 number_of_clusters=3,
+                 number_of_bots_per_cluster=10,
+                 enemy_acceleration=0.005,
+                 difficulty=None,
+                 map_segment_size=(600, 600),
+                 initial_object_height=10,
+                 screen_size=(1800, 840),
+                 ticks_per_step=1,
+                 ticks_per_render_frame=50,
+                 gravity=(0.0, -900),
+                 map_bottom_y_threshold=-300,
+                 map_width=5,
+                 map_point_spacing=None,
+                 number_of_worlds=1,
+                 heightfield_resolution=2.0,
+                 solver_iterations=6,
+                 terrain=None
+                 ):
+        # external simulation properties
+        self.debug = False
+        self.number_of_clusters = number_of_clusters
+        self.number_of_bots_per_cluster = number_of_bots_per_cluster
+        self.enemy_acceleration = enemy_acceleration
+        self.initial_object_position = (0.0, initial_object_height)
+        self.ticks_per_step = ticks_per_step
+        self.ticks_per_render_frame = ticks_per_render_frame
+        self.difficulty = difficulty
+        self.map_segment_size = map_segment_size
+        self.map_width = map_width
+        self.map_point_spacing = map_point_spacing
+        self.map_bottom_y_threshold = map_bottom_y_threshold
+        self.gravity = gravity
+        self.screen_size = screen_size
+        self.number_of_worlds = number_of_worlds
+        self.heightfield_resolution = heightfield_resolution
+        self.solver_iterations = solver_iterations
+        # pre-generated map segments per world, used before random ones are generated
+        self.terrain = [terrain] * number_of_worlds
+
+        # internal simulation properties
+        self._dt = 1 / 80.0
+        self._number_of_bots = number_of_clusters * number_of_bots_per_cluster
+        self._number_of_cells = int(round(
+            NUMBER_OF_MAP_SEGMENTS * map_segment_size[0] / heightfield_resolution)) + 1
+        self._bot_cluster = np.repeat(np.arange(number_of_clusters), number_of_bots_per_cluster)
+        self._cluster_colors = [pymunk_utils.cluster_color(cluster_nr)
+                                for cluster_nr in range(number_of_clusters)]
+
+        # body arrays over [world, body], the last body of every world is the goal object
+        bodies = self._number_of_bots + 1
+        self._position = np.zeros((number_of_worlds, bodies, 2))
+        self._velocity = np.zeros((number_of_worlds, bodies, 2))
+        self._angular_velocity = np.zeros((number_of_worlds, bodies))
+        self._goal_angle = np.zeros(number_of_worlds)
+        self._alive = np.zeros((number_of_worlds, bodies), dtype=bool)
+        self._thresholds = np.zeros((number_of_worlds, number_of_clusters))
+
+        bot_mass = pymunk_utils.BOTS_MASS
+        goal_mass = pymunk_utils.GOAL_OBJECT_MASS
+        goal_width, goal_height = pymunk_utils.GOAL_OBJECT_SIZE
+        self._inverse_mass = np.full(bodies, 1.0 / bot_mass)
+        self._inverse_mass[-1] = 1.0 / goal_mass
+        self._inverse_inertia = np.full(bodies, 2.0 / (bot_mass * pymunk_utils.BOTS_RADIUS ** 2))
+        self._inverse_inertia[-1] = 12.0 / (goal_mass * (goal_width ** 2 + goal_height ** 2))
+        self._goal_half_size = (goal_width / 2, goal_height / 2)
+        self._goal_corners = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1]]) * self._goal_half_size
+
+        # map state per world
+        self._map = [[] for _ in range(number_of_worlds)]
+        self._heights = np.full((number_of_worlds, self._number_of_cells), -np.inf)
+        self._heights_x0 = np.zeros(number_of_worlds)
+        self._segment_count = np.zeros(number_of_worlds, dtype=int)
+        self._current_map_end = np.zeros((number_of_worlds, 2))
+        self._map_middle_right_boundary = np.zeros(number_of_worlds)
+        self._enemy_position = np.zeros(number_of_worlds)
+        self._enemy_speed = np.zeros(number_of_worlds)
+
+        # pygame constants, observations are drawn offscreen, the window only opens in redraw
+        self._screen = pygame.Surface(self.screen_size)
+        self._display = None
+        self._clock = pygame.time.Clock()
+
+    # input
+    def update_thresholds_position(self, index, position, world=0):
+        self._thresholds[world, index] = position
+
+    # output
+    def threshold_positions(self, world=0):
+        return list(self._thresholds[world])
+
+    # output
+    def goal_position(self, world=0):
+        return tuple(self._position[world, -1])
+
+    # output
+    def enemy_position(self, world=0):
+        return self._enemy_position[world]
+
+    # output
+    def bots_alive(self, world=0):
+        return int(self._alive[world, :-1].sum())
+
+    # output
+    def space_near_goal_object(self, world=0):
+        self._update_screen(world)
+        return pygame.image.tostring(self._screen, "RGB")
+
+    # output
+    def snapshot(self, world=0):
+        x = self._heights_x0[world] + self.heightfield_resolution * np.arange(self._number_of_cells)
+        heights = self._heights[world]
+        covered = np.isfinite(heights)
+        ground = None
+        if covered.sum() > 1:
+            ground = self._world_to_screen(np.stack([x[covered], heights[covered]], axis=-1), world).tolist()
+
+        bots = self._world_to_screen(self._position[world, :-1], world).astype(int)
+        circles = [(self._cluster_colors[self._bot_cluster[bot]], bots[bot].tolist(), pymunk_utils.BOTS_RADIUS)
+                   for bot in np.flatnonzero(self._alive[world, :-1])]
+
+        corners = numpy_utils.rotate(self._goal_corners, self._goal_angle[world])
+        goal = self._world_to_screen(self._position[world, -1] + corners, world)
+        enemy_x = self._enemy_position[world] - self._position[world, -1, 0] + self.screen_size[0] / 2
+        return pygame_utils.Snapshot(map_sprite=None, map_position=None, ground=ground,
+                                     map_width=self.map_width, thresholds=[], bots=circles,
+                                     goal=goal.tolist(), enemy_x=enemy_x)
+
+    def set_terrain(self, terrain, world=0):
+        self.terrain[world] = terrain
+
+    def reset(self, worlds=None):
+        worlds = range(self.number_of_worlds) if worlds is None else worlds
+        scenery = []
+        for world in worlds:
+            self._map[world] = []
+            self._segment_count[world] = 0
+            self._current_map_end[world] = (pymunk_utils.FIRST_SEGMENT_START * self.map_segment_size[0], 0.0)
+            self._enemy_position[world] = pymunk_utils.FIRST_SEGMENT_START * self.map_segment_size[0]
+            self._enemy_speed[world] = 0
+
+            self._init_simulation_objects(world)
+            scenery.append(self._prepare_static_scenery(world))
+
+        # the generated segments of all worlds are interpolated in one batch
+        gen.interpolate_maps([game_map for _, maps in scenery for game_map in maps],
+                             self.map_point_spacing)
+        for world, (terrain_points, maps) in zip(worlds, scenery):
+            for points in terrain_points + [game_map.get_data_as_points() for game_map in maps]:
+                self._append_map_segment(world, points)
+            self._update_heightfield(world)
+
+    def step(self):
+        for _ in range(self.ticks_per_step):
+            self._tick()
+        self._update_map()
+        self._update_simulation_objects()
+
+    def _init_simulation_objects(self, world):
+        # draws from random in the same order as pymunk_utils.create_clusters
+        bots = []
+        for cluster_nr in range(self.number_of_clusters):
+            threshold = random.randint(-self.screen_size[0] // 6, self.screen_size[0] // 6)
+            self._thresholds[world, cluster_nr] = threshold
+            for _ in range(self.number_of_bots_per_cluster):
+                bots.append((random.randint(threshold - MAX_DISTANCE_FROM_THRESHOLD,
+                                            threshold + MAX_DISTANCE_FROM_THRESHOLD),
+                             BOT_START_HEIGHT))
+        self._position[world, :-1] = bots
+        self._position[world, -1] = self.initial_object_position
+        self._velocity[world] = 0.0
+        self._angular_velocity[world] = 0.0
+        self._goal_angle[world] = 0.0
+        self._alive[world] = True
+
+    def _prepare_static_scenery(self, world):
+        """Pre-generated points and not yet interpolated maps of the first map segments"""
+        terrain = self.terrain[world] if self.terrain[world] is not None else []
+        terrain_points = [np.asarray(points, dtype=float) for points in terrain[:NUMBER_OF_MAP_SEGMENTS]]
+        starting_point = terrain_points[-1][-1] if terrain_points else self._current_map_end[world]
+        maps = gen.generate_map_segments(self.difficulty, starting_point, self.map_segment_size,
+                                         len(terrain_points) + 1, NUMBER_OF_MAP_SEGMENTS - len(terrain_points),
+                                         pymunk_utils.SEGMENTS_PER_DIFFICULTY, interpolate=False)
+        return terrain_points, maps
+
+    def _add_map_segment(self, world):
+        segment_count = self._segment_count[world] + 1
+        terrain = self.terrain[world]
+        if terrain is not None and segment_count <= len(terrain):
+            points = np.asarray(terrain[segment_count - 1], dtype=float)
+        else:
+            game_map = gen.generate_map_segment(self.difficulty, self._current_map_end[world],
+                                                self.map_segment_size, segment_count,
+                                                pymunk_utils.SEGMENTS_PER_DIFFICULTY, self.map_point_spacing)
+            points = np.asarray(game_map.get_data_as_points(), dtype=float)
+        self._append_map_segment(world, points)
+
+    def _append_map_segment(self, world, points):
+        self._segment_count[world] += 1
+        self._map[world].append(points)
+        if len(self._map[world]) > NUMBER_OF_MAP_SEGMENTS:
+            self._map[world].pop(0)
+        self._map_middle_right_boundary[world] = self._current_map_end[world, 0]
+        self._current_map_end[world] = points[-1]
+
+    def _update_heightfield(self, world):
+        self._heights_x0[world] = self._map[world][0][0, 0]
+        self._heights[world] = numpy_utils.rasterize_heightfield(
+            self._map[world], self._heights_x0[world],
+            self.heightfield_resolution, self._number_of_cells)
+
+    def _update_map(self):
+        passed = self._position[:, -1, 0] > self._map_middle_right_boundary
+        for world in np.flatnonzero(passed):
+            self._add_map_segment(world)
+            self._update_heightfield(world)
+
+    def _update_simulation_objects(self):
+        self._update_bots()
+        self._enemy_speed += math.log1p(self.enemy_acceleration)
+        self._enemy_position += self._enemy_speed
+
+    def _update_bots(self):
+        self._thresholds += 1
+        bots = self._position[:, :-1]
+        fallen = bots[..., 1] < self.map_bottom_y_threshold
+        self._alive[:, :-1] &= ~fallen
+
+        threshold = self._thresholds[:, self._bot_cluster]
+        velocity = np.clip((bots[..., 0] - threshold) * utils.VELOCITY_COEFFICIENT,
+                           utils.MIN_BOT_VELOCITY, utils.MAX_BOT_VELOCITY)
+        self._angular_velocity[:, :-1] = np.where(self._alive[:, :-1], velocity, 0.0)
+
+    def _tick(self):
+        alive = self._alive[..., None]
+        self._velocity += np.where(alive, np.asarray(self.gravity) * self._dt, 0.0)
+
+        contacts = self._find_contacts()
+        if contacts is not None:
+            bodies = self._position.shape[0] * self._position.shape[1]
+            velocity = np.concatenate([self._velocity.reshape(bodies, 2), np.zeros((1, 2))])
+            angular_velocity = np.concatenate([self._angular_velocity.reshape(bodies), [0.0]])
+            numpy_utils.solve_contacts(velocity, angular_velocity,
+                                       np.append(np.tile(self._inverse_mass, len(self._position)), 0.0),
+                                       np.append(np.tile(self._inverse_inertia, len(self._position)), 0.0),
+                                       contacts, self._dt, self.solver_iterations)
+            self._velocity = velocity[:-1].reshape(self._velocity.shape)
+            self._angular_velocity = angular_velocity[:-1].reshape(self._angular_velocity.shape)
+
+        self._position += np.where(alive, self._velocity * self._dt, 0.0)
+        self._goal_angle += self._angular_velocity[:, -1] * self._dt
+
+    def _find_contacts(self):
+        worlds, bodies = self._position.shape[:2]
+        static = worlds * bodies
+        radius = pymunk_utils.BOTS_RADIUS
+        elasticity = pymunk_utils.ELASTICITY ** 2
+        bot_friction = pymunk_utils.FRICTION ** 2
+        goal_friction = pymunk_utils.FRICTION * pymunk_utils.GOAL_OBJECT_FRICTION
+
+        bots = self._position[:, :-1]
+        bots_alive = self._alive[:, :-1]
+        goal = self._position[:, -1]
+        parts = []
+
+        def add(body_a, body_b, offset_a, offset_b, normal, penetration, friction):
+            parts.append((body_a, body_b, offset_a, offset_b, normal, penetration,
+                          np.full(len(body_a), friction)))
+
+        # bots on the ground
+        normal, penetration, active = numpy_utils.ground_contacts(
+            bots, self._heights, self._heights_x0, self.heightfield_resolution,
+            radius + self.map_width)
+        world, bot = np.nonzero(active & bots_alive)
+        n = normal[world, bot]
+        add(world * bodies + bot, np.full(len(bot), static), -n * radius, np.zeros_like(n),
+            n, penetration[world, bot], bot_friction)
+
+        # bots against each other
+        normal, penetration, active = numpy_utils.circle_circle_contacts(bots, bots_alive, radius)
+        world, first, second = np.nonzero(active)
+        n = normal[world, first, second]
+        add(world * bodies + first, world * bodies + second, -n * radius, n * radius,
+            n, penetration[world, first, second], bot_friction)
+
+        # bots against the goal object
+        normal, penetration, offset, active = numpy_utils.circle_box_contacts(
+            bots, bots_alive, radius, goal, self._goal_angle, self._goal_half_size)
+        world, bot = np.nonzero(active)
+        n = normal[world, bot]
+        add(world * bodies + bot, world * bodies + bodies - 1, -n * radius, offset[world, bot],
+            n, penetration[world, bot], goal_friction)
+
+        # goal object corners on the ground
+        corners = numpy_utils.rotate(self._goal_corners[None], self._goal_angle[:, None])
+        normal, penetration, active = numpy_utils.ground_contacts(
+            goal[:, None] + corners, self._heights, self._heights_x0,
+            self.heightfield_resolution, self.map_width)
+        world, corner = np.nonzero(active)
+        n = normal[world, corner]
+        add(world * bodies + bodies - 1, np.full(len(corner), static), corners[world, corner],
+            np.zeros_like(n), n, penetration[world, corner], goal_friction)
+
+        body_a, body_b, offset_a, offset_b, normal, penetration, friction = (
+            np.concatenate(column) for column in zip(*parts))
+        if not len(body_a):
+            return None
+        return numpy_utils.Contacts(body_a, body_b, offset_a, offset_b, normal, penetration,
+                                    friction, np.full(len(body_a), elasticity))
+
+    def _world_to_screen(self, points, world):
+        goal = self._position[world, -1]
+        return np.stack([points[..., 0] - goal[0] + self.screen_size[0] / 2,
+                         self.screen_size[1] / 2 - (points[..., 1] - goal[1])], axis=-1)
+
+    def _update_screen(self, world):
+        pygame_utils.draw_snapshot(self._screen, self.snapshot(world))
+
+    def redraw(self, clock=False, world=0):
+        self._update_screen(world)
+        if clock is True:
+            self._clock.tick(self.ticks_per_render_frame)
+        self._display = pygame_utils.present(self._screen, self._display)
@@ -33,7 +33,9 @@ class SwarmBallSimulation(object):
                  ticks_per_render_frame=50,
                  gravity=(0.0, -900),
                  map_bottom_y_threshold=-300,
-                 map_width=5
+                 map_width=5,
+                 map_point_spacing=None,
+                 terrain=None
                  ):
         # external simulation properties
         self.debug = False
@@ -46,15 +48,19 @@ class SwarmBallSimulation(object):
         self.difficulty = difficulty
         self.map_segment_size = map_segment_size
         self.map_width = map_width
+        # distance between the interpolated map points, segment_size[0] points per segment if None
+        self.map_point_spacing = map_point_spacing
         self.map_bottom_y_threshold = map_bottom_y_threshold
         self.gravity = gravity
         self.screen_size = screen_size
+        # pre-generated map segments used in order before random ones are generated
+        self.terrain = terrain
 
         # internal simulation properties
         self._simulation_is_running = True
         self._dt = 1 / 80.0
         self._segment_count = 0
-        self._current_map_end = (-1.5 * map_segment_size[0], 0.0)
+        self._current_map_end = (pymunk_utils.FIRST_SEGMENT_START * map_segment_size[0], 0.0)
         self._map_middle_right_boundary = (0.5*map_segment_size[0], 0.0)
         self._enemy_position = -map_segment_size[0]
         self._enemy_speed = 0
@@ -67,13 +73,12 @@ class SwarmBallSimulation(object):
         self._clusters = None
         self._goal_object = None
 
-        # pygame constants
-        self._screen = pygame.display.set_mode(self.screen_size)
+        # pygame constants, observations are drawn offscreen, the window only opens in redraw
+        self._screen = pygame.Surface(self.screen_size)
+        self._display = None
         self._clock = pygame.time.Clock()
         self._draw_options = pymunk.pygame_util.DrawOptions(self._screen)
 
-        pygame.init()
-
     # input
     def update_thresholds_position(self, index, position):
         self._clusters[index].threshold.position = position
@@ -82,11 +87,40 @@ class SwarmBallSimulation(object):
     def threshold_positions(self):
         return [cluster.threshold.position for cluster in self._clusters]
 
+    # output
+    def goal_position(self):
+        return tuple(self._goal_object.body.position)
+
+    # output
+    def enemy_position(self):
+        return self._enemy_position
+
+    # output
+    def bots_alive(self):
+        return sum(len(cluster.bots) for cluster in self._clusters)
+
     # output
     def space_near_goal_object(self):
         self._update_screen()
         return pygame.image.tostring(self._screen, "RGB")
 
+    # output
+    def snapshot(self):
+        offset = (self.screen_size[0] / 2 - self._goal_object.body.position[0],
+                  -self.screen_size[1] // 2 + self._goal_object.body.position[1])
+        return pygame_utils.Snapshot(
+            map_sprite=self._map_sprite,
+            map_position=(offset[0]+self._map_offset[0], offset[1]+self._map_offset[1]),
+            ground=None,
+            map_width=self.map_width,
+            thresholds=pygame_utils.threshold_lines(self._clusters, offset) if self.debug else [],
+            bots=pygame_utils.cluster_circles(self._screen, self._clusters, offset),
+            goal=pygame_utils.goal_object_polygon(self._screen, self._goal_object, self.screen_size),
+            enemy_x=self._enemy_position + offset[0])
+
+    def set_terrain(self, terrain):
+        self.terrain = terrain
+
     def reset(self):
         if self._space is not None:
             self._space.remove(self._space._get_shapes())
@@ -95,8 +129,8 @@ class SwarmBallSimulation(object):
 
         self._map = []
         self._segment_count = 0
-        self._current_map_end = (-1.5 * self.map_segment_size[0], 0.0)
-        self._enemy_position = -1.5 * self.map_segment_size[0]
+        self._current_map_end = (pymunk_utils.FIRST_SEGMENT_START * self.map_segment_size[0], 0.0)
+        self._enemy_position = pymunk_utils.FIRST_SEGMENT_START * self.map_segment_size[0]
         self._enemy_speed = 0
 
 
@@ -124,7 +158,9 @@ class SwarmBallSimulation(object):
                                                                              starting_point=self._current_map_end,
                                                                              segment_size=self.map_segment_size,
                                                                              map_width=self.map_width,
-                                                                             segment_count=self._segment_count)
+                                                                             segment_count=self._segment_count,
+                                                                             map_points=self._terrain_segment(),
+                                                                             point_spacing=self.map_point_spacing)
             self._map.append(map_segment)
             self._map_middle_right_boundary = self._current_map_end
             self._current_map_end = segment_end_point
@@ -133,6 +169,11 @@ class SwarmBallSimulation(object):
             self._space.add(map_segment)
         self._update_map_sprite()
 
+    def _terrain_segment(self):
+        if self.terrain is not None and self._segment_count <= len(self.terrain):
+            return self.terrain[self._segment_count - 1]
+        return None
+
     def _init_simulation_objects(self):
         self._clusters = pymunk_utils.create_clusters(self.number_of_clusters,
                                                       self.screen_size,
@@ -171,7 +212,9 @@ class SwarmBallSimulation(object):
                                                                              starting_point=self._current_map_end,
                                                                              segment_size=self.map_segment_size,
                                                                              map_width=self.map_width,
-                                                                             segment_count=self._segment_count)
+                                                                             segment_count=self._segment_count,
+                                                                             map_points=self._terrain_segment(),
+                                                                             point_spacing=self.map_point_spacing)
             self._space.remove(self._map[0])
             self._map.pop(0)
             self._map.append(map_segment)
@@ -181,6 +224,8 @@ class SwarmBallSimulation(object):
             self._update_map_sprite()
 
     def _process_events(self):
+        if self._display is None:
+            return
         for event in pygame.event.get():
             if event.type == QUIT:
                 self._simulation_is_running = False
@@ -199,21 +244,16 @@ class SwarmBallSimulation(object):
         self._map_sprite = self._screen.copy()
 
     def _update_screen(self):
-        self._screen.fill(THECOLORS["white"])
-        offset = (self.screen_size[0] / 2 - self._goal_object.body.position[0],
-                  -self.screen_size[1] // 2 + self._goal_object.body.position[1])
-        self._screen.blit(self._map_sprite, (offset[0]+self._map_offset[0], offset[1]+self._map_offset[1]))
-        if self.debug:
-            pygame_utils.draw_thresholds(self._screen, self._clusters, offset, self.screen_size)
-        pygame_utils.draw_clusters(self._screen, self._clusters, offset)
-        pygame_utils.draw_goal_object(self._screen, self._goal_object, self.screen_size)
+        snapshot = self.snapshot()
+        pygame_utils.draw_snapshot(self._screen, snapshot)
+        return snapshot
 
     def redraw(self, clock=False):
-        self._update_screen()
+        snapshot = self._update_screen()
         if clock is True:
             self._clock.tick(self.ticks_per_render_frame)
-        pygame_utils.draw_enemy(self._screen, self._enemy_position, offset, self.screen_size)
-        pygame.display.flip()
+        pygame_utils.draw_enemy(self._screen, snapshot.enemy_x, (0, 0), self.screen_size)
+        self._display = pygame_utils.present(self._screen, self._display)
 
 
 if __name__ == '__main__':
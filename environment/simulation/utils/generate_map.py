@@ -1,11 +1,14 @@
 import random
 import math
-import matplotlib.pyplot as plt
 from enum import IntEnum
 import numpy as np
-from scipy.interpolate import splprep, splev
 from collections import namedtuple
 
+try:
+    from . import spline
+except ImportError:
+    import spline
+
 IS_BEHIND_PREVIOUS_POINT = False
 IS_ABOVE_PREVIOUS_POINT = False
 
@@ -20,7 +23,6 @@ class Map:
     def __init__(self, starting_point, x_offset, resolution=(1280, 720), seed=None):
         self.points_before_interpolation = []
         self.map_points = np.array([])
-        self.segments = np.array([])
         self.x_offset = x_offset
         self.y_offset = starting_point.y
         self.append_point_before_interpolation(starting_point)
@@ -42,8 +44,8 @@ class Map:
         return self.map_points
 
     def get_data_as_segments(self):
-        """Get map in format [((x1,y1), (x1,y1)), ((x1,y1), (x2,y2)), ...]"""
-        return self.segments
+        """Get map in format [((x0,y0), (x1,y1)), ((x1,y1), (x2,y2)), ...] as an (n - 1, 2, 2) array"""
+        return np.stack((self.map_points[:-1], self.map_points[1:]), axis=1)
 
     def get_seed(self):
         """Get the seed of the map"""
@@ -136,15 +138,12 @@ class Map:
         for point in points_to_add:
             self.append_point_before_interpolation(point)
 
-    def interpolate(self):
-        tck, u = splprep([self.get_X_list(), self.get_Y_list()], s=0, k=INTERPOLATION_K)
-        x_array = np.linspace(start=0, stop=1, num=self.resolution[0])
-        x_array, y_array = splev(x_array, tck, der=0)
-        x_array += self.x_offset
-        self.map_points = np.vstack((x_array, y_array)).T
-        self.segments = list(zip(self.map_points[:-1], self.map_points[1:]))
+    def interpolate(self, point_spacing=None):
+        interpolate_maps([self], point_spacing)
 
     def save_to_file(self, filename='test_map.png', fill=False):
+        # matplotlib takes longer to import than the rest of the environment together
+        import matplotlib.pyplot as plt
         plt.clf()
         plt.xlim(self.x_offset, self.resolution[0] + self.x_offset)
         plt.ylim(0.0, self.resolution[1])
@@ -154,6 +153,7 @@ class Map:
         plt.savefig(filename, dpi=100)
 
     def show_map(self, fill=False):
+        import matplotlib.pyplot as plt
         plt.clf()
         plt.xlim(self.x_offset, self.resolution[0] + self.x_offset)
         plt.ylim(0.0, self.resolution[1])
@@ -264,18 +264,76 @@ def get_level_parameters(diff_level, x_res):
     return step, angle_range
 
 
-def generate_map(seed=None, diff_level=Difficulty.PATHETIC, x_offset=0, y_offset=None, resolution=(1280, 720)):
-    """Function to generate map
-    parameters - map seed generated before, difficulty level from Difficulty Enum, starting y position, resolution
-    returns data in format [(x1,y1), (x2,y2), .....] as points coordinates
+def interpolate_maps(maps, point_spacing=None):
+    """Interpolate the random points of several maps in one batch
+    every map gets resolution[0] points, or points about point_spacing apart if it is given
     """
+    if not maps:
+        return
+    controls = [np.array(game_map.points_before_interpolation, dtype=np.float64) for game_map in maps]
+    if point_spacing is None:
+        number_of_samples = [game_map.resolution[0] for game_map in maps]
+    else:
+        number_of_samples = spline.sample_counts(controls, point_spacing)
+    for game_map, map_points in zip(maps, spline.interpolate(controls, number_of_samples)):
+        map_points[:, 0] += game_map.x_offset
+        game_map.map_points = map_points
+
+
+def prepare_map(seed=None, diff_level=Difficulty.PATHETIC, x_offset=0, y_offset=None, resolution=(1280, 720)):
+    """Random points of a map, generate_map without the interpolation"""
     if seed:
         random.setstate(seed)
     else:
         seed = random.getstate()
 
     step, angle_range = get_level_parameters(diff_level, resolution[0])
-    game_map = prepare_map_before_interpolation(resolution, step, angle_range, x_offset, y_offset, seed)
-    game_map.interpolate()
+    return prepare_map_before_interpolation(resolution, step, angle_range, x_offset, y_offset, seed)
+
+
+def generate_map(seed=None, diff_level=Difficulty.PATHETIC, x_offset=0, y_offset=None, resolution=(1280, 720),
+                 point_spacing=None):
+    """Function to generate map
+    parameters - map seed generated before, difficulty level from Difficulty Enum, starting y position, resolution,
+    distance between the interpolated points (resolution[0] points if None)
+    returns data in format [(x1,y1), (x2,y2), .....] as points coordinates
+    """
+    game_map = prepare_map(seed, diff_level, x_offset, y_offset, resolution)
+    game_map.interpolate(point_spacing)
 
     return game_map
+
+
+def segment_difficulty(difficulty, segment_count, segments_per_difficulty):
+    """Difficulty of the segment_count-th map segment, rising with distance if difficulty is None"""
+    if difficulty:
+        return difficulty
+    return Difficulty(min(segment_count // segments_per_difficulty + 1, Difficulty.WTF))
+
+
+def generate_map_segment(difficulty, starting_point, segment_size, segment_count, segments_per_difficulty,
+                         point_spacing=None):
+    """Function to generate the map segment starting where the previous one ended"""
+    diff = segment_difficulty(difficulty, segment_count, segments_per_difficulty)
+    return generate_map(diff_level=diff, x_offset=starting_point[0],
+                        y_offset=starting_point[1], resolution=segment_size, point_spacing=point_spacing)
+
+
+def generate_map_segments(difficulty, starting_point, segment_size, first_segment_count, number_of_segments,
+                          segments_per_difficulty, point_spacing=None, interpolate=True):
+    """number_of_segments consecutive map segments, interpolated in one batch
+    gives the same maps as calling generate_map_segment for each of them in turn,
+    with interpolate=False the caller batches them further with interpolate_maps
+    """
+    maps = []
+    for segment_count in range(first_segment_count, first_segment_count + number_of_segments):
+        diff = segment_difficulty(difficulty, segment_count, segments_per_difficulty)
+        game_map = prepare_map(diff_level=diff, x_offset=starting_point[0],
+                               y_offset=starting_point[1], resolution=segment_size)
+        maps.append(game_map)
+        # the interpolated segment ends exactly on its last random point
+        last_point = game_map.points_before_interpolation[-1]
+        starting_point = (last_point.x + game_map.x_offset, last_point.y)
+    if interpolate:
+        interpolate_maps(maps, point_spacing)
+    return maps
@@ -0,0 +1,65 @@
+import queue
+import threading
+
+import pygame
+
+try:
+    from . import simulation_pygame_utils as pygame_utils
+except ImportError:
+    import simulation_pygame_utils as pygame_utils
+
+
+class RenderThread:
+    """Draws simulation snapshots into observations on a background thread.
+
+    submit() hands a Snapshot over and returns at once, frame() waits for the
+    last submitted one and returns it as RGB bytes, like
+    space_near_goal_object. One snapshot is drawn at a time, submit() waits
+    for the previous frame first, so a single offscreen surface is enough.
+
+    pygame keeps the GIL while it fills, blits, draws and converts the frame,
+    so drawing only overlaps with work of the caller that releases it, like
+    torch operators, socket I/O or sleeping; not with the physics.
+    """
+
+    def __init__(self, screen_size):
+        self.surface = pygame.Surface(screen_size)
+        self._requests = queue.Queue(maxsize=1)
+        self._results = queue.Queue(maxsize=1)
+        self._in_flight = False
+        self._frame = None
+        self._thread = threading.Thread(target=self._run, name='render', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            snapshot = self._requests.get()
+            if snapshot is None:
+                return
+            try:
+                pygame_utils.draw_snapshot(self.surface, snapshot)
+                frame = pygame.image.tostring(self.surface, "RGB")
+            except Exception as error:
+                self._results.put((None, error))
+                continue
+            self._results.put((frame, None))
+
+    def submit(self, snapshot):
+        self.frame()
+        self._in_flight = True
+        self._requests.put(snapshot)
+
+    def frame(self):
+        if self._in_flight:
+            self._in_flight = False
+            frame, error = self._results.get()
+            if error is not None:
+                raise error
+            self._frame = frame
+        return self._frame
+
+    def close(self):
+        if self._thread.is_alive():
+            self._in_flight = False
+            self._requests.put(None)
+            self._thread.join()
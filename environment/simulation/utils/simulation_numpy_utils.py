@@ -0,0 +1,199 @@
+import collections
+
+import numpy as np
+
+# pymunk.Space defaults, the contact correction below has the same form as
+# Chipmunk's cpArbiterPreStep: bias * max(penetration - slop, 0) / dt
+# penetration (px) tolerated without correction, Space.collision_slop
+PENETRATION_SLOP = 0.1
+# fraction of the penetration left after one second, Space.collision_bias
+PENETRATION_BIAS_PER_SECOND = (1 - 0.1) ** 60
+# a body resting on the ground closes in at gravity * dt every tick, 900 px/s^2
+# at 80 Hz for SwarmBall. Slower impacts are resting contact and do not bounce,
+# pymunk gets there through warm started impulses which this solver lacks
+RESTITUTION_VELOCITY_THRESHOLD = 2 * 900 / 80.0
+# bodies deeper below the ground than this (px) fell through it and are left
+# alone. pymunk has no counterpart, its segments collide on both sides
+MAX_GROUND_PENETRATION = 30.0
+
+Contacts = collections.namedtuple(
+    'Contacts', 'body_a body_b offset_a offset_b normal penetration friction elasticity')
+
+
+def cross(a, b):
+    return a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+
+
+def cross_scalar(w, r):
+    """w x r for an angular velocity w and a vector r"""
+    return np.stack([-w * r[..., 1], w * r[..., 0]], axis=-1)
+
+
+def tangent(normal):
+    return np.stack([-normal[..., 1], normal[..., 0]], axis=-1)
+
+
+def rotate(vectors, angles):
+    """Rotate vectors [..., 2] by angles broadcastable to vectors[..., 0]"""
+    cos, sin = np.cos(angles), np.sin(angles)
+    return np.stack([cos * vectors[..., 0] - sin * vectors[..., 1],
+                     sin * vectors[..., 0] + cos * vectors[..., 1]], axis=-1)
+
+
+def rasterize_heightfield(segments_points, x0, dx, number_of_cells):
+    """Upper envelope of the map polylines sampled every dx starting at x0.
+
+    Cells the map does not cover are -inf, so bodies above them fall.
+    """
+    heights = np.full(number_of_cells, -np.inf)
+    for points in segments_points:
+        cells = np.rint((points[:, 0] - x0) / dx).astype(int)
+        inside = (cells >= 0) & (cells < number_of_cells)
+        np.maximum.at(heights, cells[inside], points[inside, 1])
+
+    covered = np.flatnonzero(np.isfinite(heights))
+    if len(covered):
+        span = np.arange(covered[0], covered[-1] + 1)
+        heights[span] = np.interp(span, covered, heights[covered])
+    return heights
+
+
+def sample_heightfield(heights, x0, dx, x):
+    """Ground height and slope under x [B, K] for heightfields [B, G] starting at x0 [B]"""
+    number_of_cells = heights.shape[1]
+    u = (x - x0[:, None]) / dx
+    cells = np.floor(u).astype(int)
+    valid = (cells >= 0) & (cells < number_of_cells - 1)
+    cells = np.clip(cells, 0, number_of_cells - 2)
+    fraction = u - cells
+
+    h0 = np.take_along_axis(heights, cells, axis=1)
+    h1 = np.take_along_axis(heights, cells + 1, axis=1)
+    valid &= np.isfinite(h0) & np.isfinite(h1)
+    h0 = np.where(valid, h0, 0.0)
+    h1 = np.where(valid, h1, 0.0)
+    return h0 + fraction * (h1 - h0), (h1 - h0) / dx, valid
+
+
+def ground_contacts(points, heights, x0, dx, thickness):
+    """Normal, penetration and contact mask of points [B, K, 2] against the heightfield.
+
+    thickness is the distance from the point the surface collides at, i.e. the
+    bot radius plus the map segment radius.
+    """
+    height, slope, valid = sample_heightfield(heights, x0, dx, points[..., 0])
+    cos = 1.0 / np.sqrt(1.0 + slope ** 2)
+    normal = np.stack([-slope * cos, cos], axis=-1)
+    penetration = thickness - (points[..., 1] - height) * cos
+    active = valid & (penetration > 0) & (penetration < thickness + MAX_GROUND_PENETRATION)
+    return normal, penetration, active
+
+
+def circle_circle_contacts(positions, alive, radius):
+    """Overlapping pairs i < j of circles [B, N, 2] in the same world"""
+    delta = positions[:, :, None, :] - positions[:, None, :, :]
+    distance = np.sqrt((delta ** 2).sum(axis=-1))
+    pairs = np.triu(np.ones(distance.shape[1:], dtype=bool), k=1)
+    active = (pairs & alive[:, :, None] & alive[:, None, :]
+              & (distance < 2 * radius) & (distance > 1e-9))
+    normal = delta / np.maximum(distance, 1e-9)[..., None]
+    return normal, 2 * radius - distance, active
+
+
+def circle_box_contacts(positions, alive, radius, box_position, box_angle, half_size):
+    """Contacts of circles [B, N, 2] with one box per world.
+
+    Returns the normal pointing from the box to the circle, the penetration,
+    the contact point relative to the box center and the contact mask.
+    """
+    half_size = np.asarray(half_size, dtype=float)
+    local = rotate(positions - box_position[:, None, :], -box_angle[:, None])
+    closest = np.clip(local, -half_size, half_size)
+    delta = local - closest
+    distance = np.sqrt((delta ** 2).sum(axis=-1))
+    outside = distance > 1e-9
+
+    # circle centers inside the box are pushed out through the nearest face
+    gaps = half_size - np.abs(local)
+    axis = np.argmin(gaps, axis=-1)
+    signs = np.where(local >= 0, 1.0, -1.0)
+    inside_normal = np.zeros_like(local)
+    np.put_along_axis(inside_normal, axis[..., None],
+                      np.take_along_axis(signs, axis[..., None], axis=-1), axis=-1)
+    inside_point = np.where(inside_normal != 0, inside_normal * half_size, local)
+
+    normal_local = np.where(outside[..., None], delta / np.maximum(distance, 1e-9)[..., None],
+                            inside_normal)
+    point_local = np.where(outside[..., None], closest, inside_point)
+    penetration = np.where(outside, radius - distance, radius + gaps.min(axis=-1))
+
+    active = alive & (penetration > 0)
+    normal = rotate(normal_local, box_angle[:, None])
+    offset = rotate(point_local, box_angle[:, None])
+    return normal, penetration, offset, active
+
+
+def solve_contacts(velocity, angular_velocity, inverse_mass, inverse_inertia,
+                   contacts, dt, iterations):
+    """Sequential impulses over all contacts, applied Jacobi style.
+
+    Arrays are flat over bodies, the last body is static and stands in for
+    the ground. Normals point from body_b to body_a. Friction and elasticity
+    combine like pymunk does, by multiplying the coefficients of both shapes.
+    velocity and angular_velocity are updated in place.
+    """
+    a, b = contacts.body_a, contacts.body_b
+    ra, rb = contacts.offset_a, contacts.offset_b
+    normal = contacts.normal
+    tangent_ = tangent(normal)
+
+    def relative_velocity():
+        return ((velocity[a] + cross_scalar(angular_velocity[a], ra))
+                - (velocity[b] + cross_scalar(angular_velocity[b], rb)))
+
+    def effective_mass(direction):
+        k = (inverse_mass[a] + inverse_mass[b]
+             + inverse_inertia[a] * cross(ra, direction) ** 2
+             + inverse_inertia[b] * cross(rb, direction) ** 2)
+        return 1.0 / k
+
+    normal_mass = effective_mass(normal)
+    tangent_mass = effective_mass(tangent_)
+
+    normal_velocity = (relative_velocity() * normal).sum(axis=-1)
+    bounce = np.where(normal_velocity < -RESTITUTION_VELOCITY_THRESHOLD,
+                      -contacts.elasticity * normal_velocity, 0.0)
+    bias_coefficient = 1.0 - PENETRATION_BIAS_PER_SECOND ** dt
+    bias = bias_coefficient * np.maximum(contacts.penetration - PENETRATION_SLOP, 0.0) / dt
+    target_velocity = np.maximum(bounce, bias)
+
+    # bodies in several contacts take a share of each impulse, otherwise the
+    # simultaneous updates overshoot
+    static = len(velocity) - 1
+    counts = np.bincount(np.concatenate([a, b]), minlength=len(velocity)).astype(float)
+    counts[static] = 1.0
+    relaxation = 1.0 / np.maximum(counts[a], counts[b])
+
+    normal_impulse = np.zeros(len(a))
+    tangent_impulse = np.zeros(len(a))
+    for _ in range(iterations):
+        v = relative_velocity()
+        vn = (v * normal).sum(axis=-1)
+        vt = (v * tangent_).sum(axis=-1)
+
+        new_normal_impulse = np.maximum(
+            normal_impulse + relaxation * normal_mass * (target_velocity - vn), 0.0)
+        dn = new_normal_impulse - normal_impulse
+        normal_impulse = new_normal_impulse
+
+        limit = contacts.friction * normal_impulse
+        new_tangent_impulse = np.clip(
+            tangent_impulse - relaxation * tangent_mass * vt, -limit, limit)
+        dt_ = new_tangent_impulse - tangent_impulse
+        tangent_impulse = new_tangent_impulse
+
+        impulse = dn[:, None] * normal + dt_[:, None] * tangent_
+        np.add.at(velocity, a, impulse * inverse_mass[a, None])
+        np.add.at(velocity, b, -impulse * inverse_mass[b, None])
+        np.add.at(angular_velocity, a, inverse_inertia[a] * cross(ra, impulse))
+        np.add.at(angular_velocity, b, -inverse_inertia[b] * cross(rb, impulse))
@@ -1,3 +1,5 @@
+import collections
+
 import pygame
 import pymunk
 
@@ -6,11 +8,25 @@ from pygame.color import THECOLORS
 GOAL_OBJECT_COLOR = THECOLORS["blue"]
 MAP_COLOR = THECOLORS["black"]
 
+# everything that makes up a frame, already in screen coordinates, so it can be drawn
+# on another thread while the simulation moves on. The map is either a pre-drawn
+# sprite blitted at map_position or a ground polyline.
+Snapshot = collections.namedtuple('Snapshot', ['map_sprite', 'map_position', 'ground', 'map_width',
+                                               'thresholds', 'bots', 'goal', 'enemy_x'])
+
+
+def threshold_lines(clusters, offset):
+    return [(cluster.threshold.position + offset[0], cluster.color) for cluster in clusters]
 
-def draw_thresholds(screen, clusters, offset, screen_size):
-    for cluster in clusters:
-        points = [(cluster.threshold.position + offset[0], 0), (cluster.threshold.position + offset[0], screen_size[1])]
-        pygame.draw.lines(screen, cluster.color, False, points)
+
+def present(screen, display):
+    """Shows the offscreen screen in the window, which is opened on first use; returns the display"""
+    if display is None:
+        pygame.init()
+        display = pygame.display.set_mode(screen.get_size())
+    display.blit(screen, (0, 0))
+    pygame.display.flip()
+    return display
 
 
 def draw_enemy(screen, position, offset, screen_size):
@@ -19,11 +35,13 @@ def draw_enemy(screen, position, offset, screen_size):
     screen.blit(wand_img, (position+offset[0] - 31, 0))
 
 
-def draw_clusters(screen, clusters, offset):
+def cluster_circles(screen, clusters, offset):
+    circles = []
     for cluster in clusters:
         for bot in cluster.bots:
             position = pymunk.pygame_util.to_pygame(bot.body.position, screen)
-            pygame.draw.circle(screen, bot.color, (position[0]+int(offset[0]), position[1]+int(offset[1])), int(bot.radius))
+            circles.append((bot.color, (position[0]+int(offset[0]), position[1]+int(offset[1])), int(bot.radius)))
+    return circles
 
 
 def draw_map(screen, map_segment, map_width, map_offset):
@@ -33,9 +51,21 @@ def draw_map(screen, map_segment, map_width, map_offset):
         pygame.draw.line(screen, MAP_COLOR, p1_translated - pymunk.Vec2d(map_offset), p2_translated - pymunk.Vec2d(map_offset), 2*map_width)
 
 
-def draw_goal_object(screen, goal_object, screen_size):
+def goal_object_polygon(screen, goal_object, screen_size):
     body = goal_object.body
     points = [point.rotated(body.angle) + pymunk.Vec2d(screen_size[0]//2, screen_size[1]//2) for point in goal_object.get_vertices()]
     points.append(points[0])
-    ps = [pymunk.pygame_util.to_pygame(point, screen) for point in points]
-    pygame.draw.polygon(screen, GOAL_OBJECT_COLOR, ps)
+    return [pymunk.pygame_util.to_pygame(point, screen) for point in points]
+
+
+def draw_snapshot(screen, snapshot):
+    screen.fill(THECOLORS["white"])
+    if snapshot.map_sprite is not None:
+        screen.blit(snapshot.map_sprite, snapshot.map_position)
+    if snapshot.ground is not None:
+        pygame.draw.lines(screen, MAP_COLOR, False, snapshot.ground, 2 * snapshot.map_width)
+    for x, color in snapshot.thresholds:
+        pygame.draw.lines(screen, color, False, [(x, 0), (x, screen.get_height())])
+    for color, position, radius in snapshot.bots:
+        pygame.draw.circle(screen, color, position, radius)
+    pygame.draw.polygon(screen, GOAL_OBJECT_COLOR, snapshot.goal)
@@ -18,14 +18,21 @@ GOAL_OBJECT_SIZE = (20, 20)
 GOAL_OBJECT_MASS = 30
 GOAL_OBJECT_FRICTION = 0.01
 SEGMENTS_PER_DIFFICULTY = 3
+# the map starts this many segment widths left of the origin
+FIRST_SEGMENT_START = -1.5
+
+
+def cluster_color(cluster_nr):
+    color = numpy.array([100, 100, 100])
+    color[cluster_nr % color.shape[0]] += (cluster_nr + 1) * 37
+    color[cluster_nr % color.shape[0]] = color[cluster_nr % color.shape[0]] % 256
+    return color
 
 
 def create_clusters(number_of_clusters, screen_size, number_of_bots_per_threshold):
     clusters = []
     for cluster_nr in range(number_of_clusters):
-        color = numpy.array([100, 100, 100])
-        color[cluster_nr % color.shape[0]] += (cluster_nr + 1) * 37
-        color[cluster_nr % color.shape[0]] = color[cluster_nr % color.shape[0]] % 256
+        color = cluster_color(cluster_nr)
         threshold = utils.Threshold(position=random.randint(-screen_size[0]//6, screen_size[0]//6), velocity=0)
 
         cluster = utils.Cluster(color, threshold, bots=[])
@@ -63,18 +70,15 @@ def create_goal_object(position):
     return shape
 
 
-def create_map_segment(difficulty, space, starting_point, segment_size, map_width, segment_count):
-    diff = difficulty
-
-    # setting dynamic difficulty only if difficulty == None
-    if not diff:
-        diff = segment_count//SEGMENTS_PER_DIFFICULTY + 1
-        if diff > 6:
-            diff = 6
-        diff = gen.Difficulty(diff)
-
-    map_fragments = gen.generate_map(diff_level=diff, x_offset=starting_point[0],
-                                     y_offset=starting_point[1], resolution=segment_size)
+def create_map_segment(difficulty, space, starting_point, segment_size, map_width, segment_count,
+                       map_points=None, point_spacing=None):
+    # pre-generated map_points are used as they are, otherwise a new segment is
+    # generated; difficulty rises with segment_count only if difficulty == None
+    if map_points is not None:
+        map_fragments = map_points
+    else:
+        map_fragments = gen.generate_map_segment(difficulty, starting_point, segment_size,
+                                                 segment_count, SEGMENTS_PER_DIFFICULTY, point_spacing)
     fragment_start = map_fragments[0]
     map_segment = []
     for fragment_end in map_fragments[1:]:
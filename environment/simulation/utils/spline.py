@@ -0,0 +1,170 @@
+"""Batched parametric cubic spline interpolation of map polylines.
+
+The curve through the control points is parametrised by normalised chord
+length and uses not-a-knot end conditions, which is the same interpolant
+scipy's splprep(s=0, k=3) builds, so maps keep their shape. Segments with
+different numbers of control points are padded and solved together.
+"""
+import math
+
+import numpy as np
+
+MINIMUM_CONTROL_POINTS = 4
+
+
+def chord_parameters(points):
+    """Normalised cumulative chord lengths of points [n, 2], from 0 to 1"""
+    lengths = np.sqrt((np.diff(points, axis=0) ** 2).sum(axis=1))
+    u = np.concatenate([[0.0], np.cumsum(lengths)])
+    return u / u[-1]
+
+
+def solve_tridiagonal(lower, diagonal, upper, rhs):
+    """Parallel cyclic reduction over a batch of systems.
+
+    lower, diagonal and upper are [B, m], lower[:, 0] and upper[:, -1] are
+    ignored, rhs is [B, m, k]. Every pass couples each row with the rows
+    twice as far away as before, so log2(m) vectorised passes replace the m
+    sequential steps of the Thomas algorithm. The systems solved here are
+    diagonally dominant, so no pivoting is needed.
+    """
+    batch, m = diagonal.shape
+    # m identity rows with a zero right hand side on either side stand in for
+    # the rows outside the system, so neighbours are plain slices
+    a = np.zeros((batch, 3 * m))
+    b = np.ones((batch, 3 * m))
+    c = np.zeros((batch, 3 * m))
+    d = np.zeros((batch, 3 * m, rhs.shape[2]))
+    inner = slice(m, 2 * m)
+    a[:, inner] = lower
+    b[:, inner] = diagonal
+    c[:, inner] = upper
+    d[:, inner] = rhs
+    a[:, m] = 0.0
+    c[:, 2 * m - 1] = 0.0
+
+    distance = 1
+    while distance < m:
+        previous = slice(m - distance, 2 * m - distance)
+        following = slice(m + distance, 2 * m + distance)
+        alpha = -a[:, inner] / b[:, previous]
+        gamma = -c[:, inner] / b[:, following]
+        a[:, inner], b[:, inner], c[:, inner], d[:, inner] = (
+            alpha * a[:, previous],
+            b[:, inner] + alpha * c[:, previous] + gamma * a[:, following],
+            gamma * c[:, following],
+            d[:, inner] + alpha[..., None] * d[:, previous] + gamma[..., None] * d[:, following])
+        distance *= 2
+    return d[:, inner] / b[:, inner, None]
+
+
+def second_derivatives(u, y, counts):
+    """Second derivatives at the knots of the not-a-knot cubic through (u, y).
+
+    u [B, n] and y [B, n, 2] are padded past counts[b] points, the padding
+    rows are decoupled identity rows and come out as zeros.
+    """
+    batch, n = u.shape
+    h = np.diff(u, axis=1)
+    slopes = np.diff(y, axis=1) / h[..., None]
+    rows = np.arange(1, n - 1)
+    active = rows[None, :] < (counts - 1)[:, None]
+
+    # rows 1..n-2 of the classic system h[i-1] M[i-1] + 2 (h[i-1] + h[i]) M[i] + h[i] M[i+1]
+    lower = h[:, :-1].copy()
+    diagonal = 2 * (h[:, :-1] + h[:, 1:])
+    upper = h[:, 1:].copy()
+    rhs = 6 * (slopes[:, 1:] - slopes[:, :-1])
+
+    # not-a-knot: the third derivative is continuous at the second and the
+    # second to last knot, M[0] and M[-1] are substituted into their neighbours
+    whole = np.arange(batch)
+    h0, h1 = h[:, 0], h[:, 1]
+    diagonal[:, 0] = (h0 + h1) * (h0 + 2 * h1) / h1
+    upper[:, 0] = (h1 - h0) * (h1 + h0) / h1
+    last = counts - 3
+    a, b = h[whole, counts - 3], h[whole, counts - 2]
+    lower[whole, last] = (a - b) * (a + b) / a
+    diagonal[whole, last] = (a + b) * (2 * a + b) / a
+    upper[whole, last] = 0.0
+
+    lower = np.where(active, lower, 0.0)
+    upper = np.where(active, upper, 0.0)
+    diagonal = np.where(active, diagonal, 1.0)
+    rhs = np.where(active[..., None], rhs, 0.0)
+    inner = solve_tridiagonal(lower, diagonal, upper, rhs)
+
+    M = np.zeros_like(y)
+    M[:, 1:-1] = inner
+    M[:, 0] = ((h0 + h1)[:, None] * inner[:, 0] - h0[:, None] * inner[:, 1]) / h1[:, None]
+    M[whole, counts - 1] = ((a + b)[:, None] * inner[whole, last]
+                            - b[:, None] * inner[whole, last - 1]) / a[:, None]
+    return M
+
+
+def sample_counts(segments_points, point_spacing):
+    """Samples per segment so that consecutive output points are about point_spacing apart"""
+    counts = []
+    for points in segments_points:
+        length = np.sqrt((np.diff(points, axis=0) ** 2).sum(axis=1)).sum()
+        counts.append(max(int(math.ceil(length / point_spacing)) + 1, 2))
+    return counts
+
+
+def interpolate(segments_points, number_of_samples):
+    """Evaluate the spline through every segment's control points.
+
+    segments_points is a sequence of [n_b, 2] arrays with n_b >= 4,
+    number_of_samples an int or one int per segment. Samples are evenly
+    spaced in the chord length parameter, the first and last equal the
+    segment's end points exactly. Returns a list of contiguous [samples, 2]
+    float64 arrays.
+    """
+    segments_points = [np.asarray(points, dtype=np.float64) for points in segments_points]
+    batch = len(segments_points)
+    if isinstance(number_of_samples, int):
+        number_of_samples = [number_of_samples] * batch
+    counts = np.array([len(points) for points in segments_points])
+    if counts.min() < MINIMUM_CONTROL_POINTS:
+        raise ValueError('A cubic spline needs at least {} control points, got {}'.format(
+            MINIMUM_CONTROL_POINTS, counts.min()))
+
+    n = counts.max()
+    u = np.empty((batch, n))
+    y = np.empty((batch, n, 2))
+    for b, points in enumerate(segments_points):
+        u[b, :counts[b]] = chord_parameters(points)
+        y[b, :counts[b]] = points
+        # padding continues with unit steps so h stays positive
+        u[b, counts[b]:] = 1.0 + np.arange(1, n - counts[b] + 1)
+        y[b, counts[b]:] = points[-1]
+    M = second_derivatives(u, y, counts)
+
+    # all samples at once: segment b's parameters are shifted by b * offset so
+    # a single searchsorted finds every interval
+    offset = float(n + 1)
+    samples = np.concatenate([np.linspace(0.0, 1.0, num) for num in number_of_samples])
+    owner = np.repeat(np.arange(batch), number_of_samples)
+    flat_u = (u + offset * np.arange(batch)[:, None]).ravel()
+    index = np.searchsorted(flat_u, samples + offset * owner, side='right') - 1
+    index = np.clip(index - owner * n, 0, counts[owner] - 2)
+
+    u0, u1 = u[owner, index], u[owner, index + 1]
+    y0, y1 = y[owner, index], y[owner, index + 1]
+    M0, M1 = M[owner, index], M[owner, index + 1]
+    step = (u1 - u0)[:, None]
+    left = (u1 - samples)[:, None]
+    right = (samples - u0)[:, None]
+    values = ((M0 * left ** 3 + M1 * right ** 3) / (6 * step)
+              + (y0 / step - M0 * step / 6) * left
+              + (y1 / step - M1 * step / 6) * right)
+
+    result = []
+    start = 0
+    for b, num in enumerate(number_of_samples):
+        points = np.ascontiguousarray(values[start:start + num])
+        points[0] = segments_points[b][0]
+        points[-1] = segments_points[b][-1]
+        result.append(points)
+        start += num
+    return result
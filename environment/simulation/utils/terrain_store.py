@@ -0,0 +1,97 @@
+import json
+import os
+import random
+
+import numpy as np
+
+try:
+    from . import generate_map as gen
+    from .simulation_pymunk_utils import FIRST_SEGMENT_START, SEGMENTS_PER_DIFFICULTY
+except ImportError:
+    import generate_map as gen
+    from simulation_pymunk_utils import FIRST_SEGMENT_START, SEGMENTS_PER_DIFFICULTY
+
+INDEX_FILE = 'index.json'
+POINTS_FILE = 'points.npy'
+OFFSETS_FILE = 'offsets.npy'
+
+
+def generate_terrain(seed, difficulty, segment_size, number_of_segments, point_spacing=None):
+    """The chain of map segments a simulation would generate after random.seed(seed).
+
+    Returns a list of (n, 2) point arrays, segment k starting where k - 1 ended.
+    """
+    state = random.getstate()
+    random.seed(seed)
+    # the random walk of generate_next_point carries over between calls
+    gen.IS_BEHIND_PREVIOUS_POINT = False
+    gen.IS_ABOVE_PREVIOUS_POINT = False
+    try:
+        starting_point = (FIRST_SEGMENT_START * segment_size[0], 0.0)
+        maps = gen.generate_map_segments(difficulty, starting_point, segment_size, 1, number_of_segments,
+                                         SEGMENTS_PER_DIFFICULTY, point_spacing)
+        return [game_map.get_data_as_points() for game_map in maps]
+    finally:
+        random.setstate(state)
+
+
+class TerrainStore:
+    """Read-only collection of pre-generated terrains, keyed by (difficulty, seed).
+
+    All segments live in one memory-mapped points array, so processes loading
+    the same store share its pages instead of each holding a copy.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE)) as index_file:
+            index = json.load(index_file)
+        self.segment_size = tuple(index['segment_size'])
+        self.number_of_segments = index['number_of_segments']
+        self.point_spacing = index.get('point_spacing')
+        self.keys = [tuple(key) for key in index['keys']]
+        self._positions = {key: position for position, key in enumerate(self.keys)}
+        self._points = np.load(os.path.join(path, POINTS_FILE), mmap_mode='r')
+        self._offsets = np.load(os.path.join(path, OFFSETS_FILE))
+
+    @staticmethod
+    def difficulty_key(difficulty):
+        # 0 stands for the dynamic difficulty, i.e. difficulty=None
+        return int(difficulty) if difficulty else 0
+
+    @classmethod
+    def build(cls, path, seeds_per_difficulty, segment_size=(600, 600), number_of_segments=10,
+              point_spacing=None):
+        """Generate and save the terrains of seeds_per_difficulty, a {difficulty: seeds} mapping"""
+        os.makedirs(path, exist_ok=True)
+        keys, segments = [], []
+        for difficulty, seeds in seeds_per_difficulty.items():
+            for seed in seeds:
+                keys.append((cls.difficulty_key(difficulty), int(seed)))
+                segments.extend(generate_terrain(seed, difficulty, segment_size, number_of_segments,
+                                                 point_spacing))
+
+        offsets = np.cumsum([0] + [len(points) for points in segments])
+        np.save(os.path.join(path, POINTS_FILE), np.concatenate(segments))
+        np.save(os.path.join(path, OFFSETS_FILE), offsets)
+        with open(os.path.join(path, INDEX_FILE), 'w') as index_file:
+            json.dump({'segment_size': list(segment_size),
+                       'number_of_segments': number_of_segments,
+                       'point_spacing': point_spacing,
+                       'keys': keys}, index_file)
+        return cls(path)
+
+    def __contains__(self, key):
+        difficulty, seed = key
+        return (self.difficulty_key(difficulty), seed) in self._positions
+
+    def seeds(self, difficulty):
+        key = self.difficulty_key(difficulty)
+        return [seed for difficulty_key, seed in self.keys if difficulty_key == key]
+
+    def terrain(self, difficulty, seed):
+        """Segments of one terrain as read-only views into the store"""
+        position = self._positions[(self.difficulty_key(difficulty), seed)]
+        first = position * self.number_of_segments
+        return [self._points[self._offsets[segment]:self._offsets[segment + 1]]
+                for segment in range(first, first + self.number_of_segments)]
@@ -5,21 +5,41 @@ import numpy as np
 
 try:
     from .simulation.simulation import SwarmBallSimulation
+    from .simulation.numpy_simulation import NumpySwarmBallSimulation
+    from .simulation.utils.render_thread import RenderThread
 except ImportError:
     from simulation.simulation import SwarmBallSimulation
+    from simulation.numpy_simulation import NumpySwarmBallSimulation
+    from simulation.utils.render_thread import RenderThread
+
+PHYSICS_BACKENDS = {
+    'pymunk': SwarmBallSimulation,
+    'numpy': NumpySwarmBallSimulation,
+}
+
+# inline: the picture is drawn by step() itself
+# lagged: step() returns the picture of the previous step, drawn on a RenderThread
+# while the caller works on that observation. pygame holds the GIL while drawing,
+# so this only overlaps with work that releases it, like torch inference
+RENDERING_MODES = ('inline', 'lagged')
 
 
 class SwarmBall(gym.Env):
-    def __init__(self, acc_factor=0.25, number_of_clusters=3, v_max=10, **kwargs):
-        self.sim = SwarmBallSimulation(number_of_clusters, **kwargs)
+    def __init__(self, acc_factor=0.25, number_of_clusters=3, v_max=10, physics='pymunk',
+                 rendering='inline', **kwargs):
+        if rendering not in RENDERING_MODES:
+            raise ValueError('Unknown rendering mode {!r}, expected one of {}'.format(rendering, RENDERING_MODES))
+        self.sim = PHYSICS_BACKENDS[physics](number_of_clusters, **kwargs)
         self.cluster_count = number_of_clusters
         self.thresh_vel = np.zeros(number_of_clusters)
         self.v_max = v_max
         self.acc_factor = acc_factor
+        self.rendering = rendering
+        self.renderer = None if rendering == 'inline' else RenderThread(self.sim.screen_size)
 
     def reward(self):
-        points = self.sim._goal_object.body.position[0] - self.goal_prev_pos
-        self.goal_prev_pos = self.sim._goal_object.body.position[0]
+        points = self.sim.goal_position()[0] - self.goal_prev_pos
+        self.goal_prev_pos = self.sim.goal_position()[0]
         return points
 
     def step(self, action):
@@ -29,15 +49,26 @@ class SwarmBall(gym.Env):
             self.sim.update_thresholds_position(
                 i, self.sim.threshold_positions()[i] + self.thresh_vel[i])
         self.sim.step()
-        observations = {'picture': self.sim.space_near_goal_object(), 'thresholds': np.array(self.sim.threshold_positions()) - self.sim._goal_object.body.position[0]}
-        return observations, self.reward(), self.sim._enemy_position >= self.sim._goal_object.body.position[0] , {'message': 'You look great today cutiepie!'}
+        if self.renderer is None:
+            picture = self.sim.space_near_goal_object()
+        else:
+            # submitted by the previous step
+            picture = self.renderer.frame()
+            self.renderer.submit(self.sim.snapshot())
+        observations = {'picture': picture, 'thresholds': np.array(self.sim.threshold_positions()) - self.sim.goal_position()[0]}
+        return observations, self.reward(), self.sim.enemy_position() >= self.sim.goal_position()[0], {'message': 'You look great today cutiepie!'}
 
     def reset(self):
         self.thresh_vel = [0 for _ in range(self.cluster_count)]
         self.sim.reset()
-        self.goal_prev_pos = self.sim._goal_object.body.position[0]
-        self.initial_goal_position = self.sim._goal_object.body.position[0]
-        return {'picture': self.sim.space_near_goal_object(), 'thresholds': np.array(self.sim.threshold_positions()) - self.sim._goal_object.body.position[0]}
+        self.goal_prev_pos = self.sim.goal_position()[0]
+        self.initial_goal_position = self.sim.goal_position()[0]
+        if self.renderer is None:
+            picture = self.sim.space_near_goal_object()
+        else:
+            self.renderer.submit(self.sim.snapshot())
+            picture = self.renderer.frame()
+        return {'picture': picture, 'thresholds': np.array(self.sim.threshold_positions()) - self.sim.goal_position()[0]}
 
     def render(self):
         self.sim.redraw()
@@ -46,4 +77,5 @@ class SwarmBall(gym.Env):
         """
             Zamknięcie środowiska.
         """
-        pass
+        if self.renderer is not None:
+            self.renderer.close()
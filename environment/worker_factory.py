@@ -0,0 +1,41 @@
+"""multiprocessing contexts for rollout and evaluation workers.
+
+A spawned worker starts a fresh interpreter and imports torch, pygame,
+pymunk and the environment again, which takes longer than most evaluation
+episodes. A forkserver context instead starts one server process that
+imports PRELOAD_MODULES once, every worker is then forked from it with
+those modules already loaded. Pools and processes made by the context
+behave like spawned ones: arguments are pickled and nothing of the parent's
+state besides the preloaded modules is inherited.
+"""
+import multiprocessing
+import os
+
+# imported once by the fork server, failing imports are skipped
+PRELOAD_MODULES = ('numpy', 'torch', 'gym', 'pygame', 'pymunk',
+                   'environment.swarmball_env', 'policy_network.HiveNet')
+
+
+def init_headless_worker():
+    """Set up a pool worker process to run SwarmBall without a screen.
+
+    Call it first in the pool initializer, before pygame initializes SDL.
+    """
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    # SDL turns SIGTERM into a quit event otherwise, Pool.terminate then hangs
+    os.environ['SDL_NO_SIGNAL_HANDLERS'] = '1'
+
+
+def worker_context(start_method='forkserver', preload=PRELOAD_MODULES):
+    """multiprocessing context for start_method, preloading for 'forkserver'.
+
+    Falls back to spawn where forkserver is not available (Windows). There
+    is one fork server per parent process and preload only applies if it is
+    set before the server starts, i.e. before the first forkserver worker.
+    """
+    if start_method == 'forkserver' and 'forkserver' not in multiprocessing.get_all_start_methods():
+        start_method = 'spawn'
+    context = multiprocessing.get_context(start_method)
+    if start_method == 'forkserver':
+        context.set_forkserver_preload(list(preload))
+    return context
@@ -0,0 +1,155 @@
+"""Fixed-seed evaluation of a saved HiveNet.
+
+Build the suite once, then evaluate any number of checkpoints on it:
+    python -m evaluation.evaluate build-suite suites/default --episodes 20
+    python -m evaluation.evaluate run policy.pt suites/default --workers 8
+"""
+import argparse
+import math
+import random
+
+import numpy as np
+import torch
+
+from environment.simulation.utils.generate_map import Difficulty
+from environment.simulation.utils.terrain_store import TerrainStore
+from environment.swarmball_env import SwarmBall
+from environment.worker_factory import init_headless_worker, worker_context
+from policy_network.HiveNet import bit_representation
+from policy_network.checkpoint import load_policy
+
+METRICS = ('distance', 'episode_length', 'bots_lost')
+
+# per worker process state, filled by _init_worker
+_worker = {}
+
+
+def _init_worker(policy_path, suite_path, env_kwargs):
+    init_headless_worker()
+    torch.set_num_threads(1)
+    store = TerrainStore(suite_path)
+    net = load_policy(policy_path).eval()
+    # segments generated past the stored terrain keep the suite's point density
+    env = SwarmBall(number_of_clusters=net.num_of_thresholds, map_segment_size=store.segment_size,
+                    map_point_spacing=store.point_spacing, **env_kwargs)
+    _worker.update(net=net, env=env, store=store)
+
+
+def run_episode(net, env, terrain, difficulty, seed, max_steps, greedy=True):
+    """Play one episode on a pre-generated terrain until the enemy catches the goal"""
+    random.seed(seed)
+    torch.manual_seed(seed)
+    env.sim.difficulty = Difficulty(difficulty) if difficulty else None
+    env.sim.set_terrain(terrain)
+    net.reset_history()
+    observation = env.reset()
+    bots = env.sim.bots_alive()
+
+    steps = 0
+    done = False
+    with torch.no_grad():
+        while not done and steps < max_steps:
+            distribution, _ = net.action_distribution(
+                observation['picture'], observation['thresholds'])
+            action = distribution.probs.argmax() if greedy else distribution.sample()
+            observation, _, done, _ = env.step(
+                bit_representation(action.item(), num_bits=net.num_of_thresholds))
+            steps += 1
+
+    return {'distance': env.sim.goal_position()[0] - env.initial_goal_position,
+            'episode_length': steps,
+            'bots_lost': bots - env.sim.bots_alive(),
+            'caught': bool(done)}
+
+
+def _run_task(task):
+    difficulty, seed, max_steps, greedy = task
+    result = run_episode(_worker['net'], _worker['env'], _worker['store'].terrain(difficulty, seed),
+                         difficulty, seed, max_steps, greedy)
+    result.update(difficulty=difficulty, seed=seed)
+    return result
+
+
+def confidence_interval(values, z=1.96):
+    """Mean and half width of its normal approximation confidence interval"""
+    values = np.asarray(values, dtype=float)
+    if len(values) < 2:
+        return values.mean(), float('nan')
+    return values.mean(), z * values.std(ddof=1) / math.sqrt(len(values))
+
+
+def summarize(results):
+    """{difficulty: {metric: (mean, half width)}} with the caught rate as an extra metric"""
+    summary = {}
+    for difficulty in sorted({result['difficulty'] for result in results}):
+        episodes = [result for result in results if result['difficulty'] == difficulty]
+        summary[difficulty] = {metric: confidence_interval([episode[metric] for episode in episodes])
+                               for metric in METRICS + ('caught',)}
+    return summary
+
+
+def build_suite(path, difficulties=tuple(Difficulty), episodes_per_difficulty=20,
+                segment_size=(600, 600), number_of_segments=10, first_seed=0):
+    seeds = range(first_seed, first_seed + episodes_per_difficulty)
+    return TerrainStore.build(path, {difficulty: seeds for difficulty in difficulties},
+                              segment_size, number_of_segments)
+
+
+def evaluate(policy_path, suite_path, workers=None, max_steps=1000, greedy=True,
+             start_method='forkserver', **env_kwargs):
+    """Run every episode of the suite in a process pool, returns (summary, results)"""
+    store = TerrainStore(suite_path)
+    tasks = [(difficulty, seed, max_steps, greedy) for difficulty, seed in store.keys]
+    context = worker_context(start_method)
+    pool = context.Pool(workers, initializer=_init_worker,
+                        initargs=(policy_path, suite_path, env_kwargs))
+    try:
+        results = pool.map(_run_task, tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    return summarize(results), results
+
+
+def print_summary(summary):
+    print('{:<12}'.format('difficulty') + ''.join('{:>22}'.format(metric) for metric in METRICS + ('caught',)))
+    for difficulty, metrics in summary.items():
+        name = Difficulty(difficulty).name if difficulty else 'DYNAMIC'
+        print('{:<12}'.format(name) + ''.join(
+            '{:>22}'.format('{:.2f} +- {:.2f}'.format(*metrics[metric]))
+            for metric in METRICS + ('caught',)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build-suite', help='pre-generate the terrains of an evaluation suite')
+    build.add_argument('suite')
+    build.add_argument('--episodes', type=int, default=20, help='episodes per difficulty')
+    build.add_argument('--segments', type=int, default=10, help='pre-generated map segments per episode')
+    build.add_argument('--difficulties', nargs='+', default=[difficulty.name for difficulty in Difficulty],
+                       choices=[difficulty.name for difficulty in Difficulty] + ['DYNAMIC'])
+
+    run = commands.add_parser('run', help='evaluate a policy saved with checkpoint.save_policy')
+    run.add_argument('policy')
+    run.add_argument('suite')
+    run.add_argument('--workers', type=int, default=None)
+    run.add_argument('--max-steps', type=int, default=1000)
+    run.add_argument('--sample', action='store_true', help='sample actions instead of acting greedily')
+    run.add_argument('--physics', default='pymunk', choices=['pymunk', 'numpy'])
+    run.add_argument('--start-method', default='forkserver', choices=['forkserver', 'spawn', 'fork'])
+    args = parser.parse_args()
+
+    if args.command == 'build-suite':
+        difficulties = [None if name == 'DYNAMIC' else Difficulty[name] for name in args.difficulties]
+        build_suite(args.suite, difficulties, args.episodes, number_of_segments=args.segments)
+    else:
+        summary, _ = evaluate(args.policy, args.suite, args.workers, args.max_steps,
+                              greedy=not args.sample, start_method=args.start_method,
+                              physics=args.physics)
+        print_summary(summary)
+
+
+if __name__ == '__main__':
+    main()
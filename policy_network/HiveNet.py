@@ -8,16 +8,33 @@ from .hive_vision.HiveNetVision import HiveNetVision
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
 
+def bit_representation(action, num_bits):
+    return np.unpackbits(np.uint8(action))[-num_bits:]
+
+
 class HiveNet(nn.Module):
     def __init__(self, kernel_size, stride, num_of_thresholds,
                  hidden_layer_size=64,
                  vision_net_output=32,
                  actions_per_threshold=2,
-                 time_steps_stored=2):
+                 time_steps_stored=2,
+                 image_compressed_size=(90, 60),
+                 frame_size=(1800, 840)):
 
         super(HiveNet, self).__init__()
+        # constructor arguments, saved alongside the weights by checkpoint.save_policy
+        self.config = dict(kernel_size=kernel_size, stride=stride,
+                           num_of_thresholds=num_of_thresholds,
+                           hidden_layer_size=hidden_layer_size,
+                           vision_net_output=vision_net_output,
+                           actions_per_threshold=actions_per_threshold,
+                           time_steps_stored=time_steps_stored,
+                           image_compressed_size=tuple(image_compressed_size),
+                           frame_size=tuple(frame_size))
         self.vision = HiveNetVision(
-            kernel_size, stride, outputs=vision_net_output).to(device)
+            kernel_size, stride, outputs=vision_net_output,
+            image_compressed_size=image_compressed_size,
+            frame_size=frame_size).to(device)
         self.num_of_thresholds = num_of_thresholds
         self.policy_hidden1 = nn.Linear(in_features=vision_net_output + time_steps_stored * self.num_of_thresholds,
                                         out_features=hidden_layer_size).to(device)
@@ -42,17 +59,24 @@ class HiveNet(nn.Module):
             self.thresholds_history.append(new_thresholds)
         return self.thresholds_history
 
-    def pick_action(self, map_input, thresholds, collector):
+    def reset_history(self):
+        self.thresholds_history = None
+        self.vision.map_history = None
+
+    def action_distribution(self, map_input, thresholds, preprocessed=False):
         new_thresholds = torch.Tensor(thresholds).to(device)
         self.update_thresholds_history(new_thresholds)
 
-        x = self.vision(map_input).to(device)
+        x = self.vision(map_input, preprocessed).to(device)
         x = torch.cat([x, *self.thresholds_history]).to(device)
 
         actor_x = F.relu(self.policy_hidden1(x)).to(device)
         actor_x = F.relu(self.policy_output(actor_x)).to(device)
         action_probabilities = F.softmax(actor_x).to(device)
-        distribution = Categorical(action_probabilities)
+        return Categorical(action_probabilities), x
+
+    def pick_action(self, map_input, thresholds, collector):
+        distribution, x = self.action_distribution(map_input, thresholds)
         action = distribution.sample().to(device)
 
         collector.states.append(x)
@@ -60,9 +84,6 @@ class HiveNet(nn.Module):
         collector.action_logarithms.append(
             distribution.log_prob(action))
 
-        def bit_representation(action, num_bits):
-            return np.unpackbits(np.uint8(action))[-num_bits:]
-
         return bit_representation(action.item(), num_bits=self.num_of_thresholds)
 
     def evaluate(self, state, action):
@@ -73,8 +94,13 @@ class HiveNet(nn.Module):
         logarithm_probabilities = distribution.log_prob(action).to(device)
         entropy = distribution.entropy().to(device)
 
+        return logarithm_probabilities, self.value(state), entropy
+
+    def value(self, state):
         critic_x = F.relu(self.value_hidden1(state)).to(device)
         critic_x = F.relu(self.value_output(critic_x)).to(device)
         Qvalue = F.tanh(critic_x).to(device)
+        return torch.squeeze(Qvalue)
 
-        return logarithm_probabilities, torch.squeeze(Qvalue), entropy
+    def forward(self, state, action):
+        return self.evaluate(state, action)
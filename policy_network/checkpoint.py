@@ -0,0 +1,19 @@
+import torch
+
+from .HiveNet import HiveNet
+
+
+def save_policy(net, path, **extra):
+    """Save a HiveNet with the arguments needed to rebuild it; extra entries are stored as well."""
+    torch.save(dict(extra, config=net.config, state_dict=net.state_dict()), path)
+
+
+def load_checkpoint(path, map_location='cpu'):
+    return torch.load(path, map_location=map_location)
+
+
+def load_policy(path, map_location='cpu'):
+    checkpoint = load_checkpoint(path, map_location)
+    net = HiveNet(**checkpoint['config'])
+    net.load_state_dict(checkpoint['state_dict'])
+    return net
@@ -1,23 +1,34 @@
+import warnings
+
+import numpy as np
 import torch
 from torch import nn
 from torch.nn import functional as F
-import torchvision.transforms as T
-from PIL import Image
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+# ITU-R 601-2 luma transform, the same one PIL's "L" conversion uses
+GRAYSCALE_WEIGHTS = (0.299, 0.587, 0.114)
+
+
 class HiveNetVision(nn.Module):
 
     def __init__(self, kernel_size, stride, outputs,
                  hidden_layer_dims=(16, 32),
                  frames_per_input=3,
-                 image_compressed_size=(90, 60)):
+                 image_compressed_size=(90, 60),
+                 frame_size=(1800, 840)):
 
         super(HiveNetVision, self).__init__()
 
-        self.process_image_input = T.Compose([T.Grayscale(),
-                                              T.Resize(
-                                                  image_compressed_size, interpolation=Image.CUBIC),
-                                              T.ToTensor()])
+        # frame_size is (width, height) like the simulation's screen_size,
+        # image_compressed_size is (height, width) like T.Resize used to take
+        self.frame_size = frame_size
+        self.image_compressed_size = tuple(image_compressed_size)
+        # not persistent, checkpoints keep the state_dict keys they had
+        self.register_buffer('grayscale_weights',
+                             torch.tensor(GRAYSCALE_WEIGHTS).to(device),
+                             persistent=False)
         self.map_history = None
         self.frames_per_input = frames_per_input
         self.map_history_shape = (
@@ -40,10 +51,32 @@ class HiveNetVision(nn.Module):
         linear_input_size = conv_width * conv_height * hidden_layer2_size
         self.output = nn.Linear(linear_input_size, outputs).to(device)
 
-    def forward(self, map_image):
-        map_image = Image.frombytes(
-            mode='RGB', size=(1280, 540), data=map_image)
-        x = self.process_image_input(map_image).to(device)
+    def as_frame_tensor(self, frames):
+        """Wrap raw RGB frames as a uint8 [N, H, W, 3] tensor without copying.
+
+        Accepts the bytes returned by the simulation, a NumPy array or a tensor,
+        either a single frame [H, W, 3] or a batch [N, H, W, 3].
+        """
+        width, height = self.frame_size
+        if isinstance(frames, (bytes, bytearray, memoryview)):
+            frames = np.frombuffer(frames, dtype=np.uint8)
+        if isinstance(frames, np.ndarray):
+            with warnings.catch_warnings():
+                # frames from pygame are read-only, they are never written to here
+                warnings.simplefilter('ignore', UserWarning)
+                frames = torch.from_numpy(frames)
+        return frames.reshape(-1, height, width, 3)
+
+    def preprocess(self, frames):
+        """Grayscale and downsample a batch of frames to [N, 1, *image_compressed_size]."""
+        x = self.as_frame_tensor(frames).to(device)
+        x = torch.matmul(x.float(), self.grayscale_weights) / 255.0
+        x = F.interpolate(x.unsqueeze(1), size=self.image_compressed_size, mode='area')
+        return x
+
+    def forward(self, map_image, preprocessed=False):
+        # preprocessed: map_image is already a [1, *image_compressed_size] output of preprocess
+        x = map_image.to(device) if preprocessed else self.preprocess(map_image)[0]
 
         if self.map_history is None:
             self.map_history = []
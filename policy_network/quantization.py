@@ -0,0 +1,226 @@
+import copy
+import time
+import warnings
+
+import torch
+from torch import nn
+from torch.distributions import kl_divergence
+from torch.ao.quantization import (DeQuantStub, FixedQParamsObserver, QConfig, QuantStub, convert,
+                                   fuse_modules, get_default_qconfig, prepare, quantize_dynamic)
+
+from .HiveNet import bit_representation
+
+# linears on the path from the frame to the action, the value head is only
+# needed by the learner
+QUANTIZED_LINEARS = ('policy_hidden1', 'policy_output', 'vision.output')
+
+
+class _BatchedLinear(nn.Module):
+    """Quantized linears expect a batch dimension, HiveNet feeds single vectors."""
+
+    def __init__(self, linear):
+        super(_BatchedLinear, self).__init__()
+        self.linear = linear
+
+    def forward(self, x):
+        if x.dim() == 1:
+            return self.linear(x.unsqueeze(0)).squeeze(0)
+        return self.linear(x)
+
+
+def _prepare_vision_convolutions(vision, engine, activation_qparams=None):
+    # folds bn1/bn2 into the convolutions and replaces them with Identity
+    fuse_modules(vision, [['conv1', 'bn1'], ['conv2', 'bn2']], inplace=True)
+    vision.conv1 = nn.Sequential(QuantStub(), vision.conv1)
+    vision.conv2 = nn.Sequential(vision.conv2, DeQuantStub())
+
+    qconfig = get_default_qconfig(engine)
+    vision.conv1.qconfig = qconfig
+    vision.conv2.qconfig = qconfig
+    # already calibrated activations keep their qparams, only the weights are observed
+    for name, qparams in (activation_qparams or {}).items():
+        vision.get_submodule(name).qconfig = QConfig(
+            activation=FixedQParamsObserver.with_args(**qparams), weight=qconfig.weight)
+    prepare(vision, inplace=True)
+
+
+def record_observations(env, net, steps):
+    """Observations from running net in env, used to calibrate a quantized copy.
+
+    Frames are stored downsampled by net.vision.preprocess, as 'frame'.
+    """
+    observations = []
+    net.reset_history()
+    observation = env.reset()
+    with torch.no_grad():
+        for _ in range(steps):
+            frame = net.vision.preprocess(observation['picture'])[0].cpu()
+            observations.append({'frame': frame, 'thresholds': observation['thresholds']})
+            distribution, _ = net.action_distribution(frame, observation['thresholds'], preprocessed=True)
+            action = bit_representation(distribution.sample().item(),
+                                        num_bits=net.num_of_thresholds)
+            observation, _, done, _ = env.step(action)
+            if done:
+                net.reset_history()
+                observation = env.reset()
+    net.reset_history()
+    return observations
+
+
+def calibrate(net, observations):
+    net.reset_history()
+    with torch.no_grad():
+        for observation in observations:
+            net.action_distribution(observation['frame'], observation['thresholds'], preprocessed=True)
+    net.reset_history()
+
+
+def action_kl(reference_net, net, observations):
+    """Mean and max KL(reference || net) of the action distributions on observations."""
+    reference_net.reset_history()
+    net.reset_history()
+    divergences = []
+    with torch.no_grad():
+        for observation in observations:
+            reference_distribution, _ = reference_net.action_distribution(
+                observation['frame'], observation['thresholds'], preprocessed=True)
+            distribution, _ = net.action_distribution(
+                observation['frame'], observation['thresholds'], preprocessed=True)
+            divergences.append(kl_divergence(reference_distribution, distribution).item())
+    reference_net.reset_history()
+    net.reset_history()
+    return sum(divergences) / len(divergences), max(divergences)
+
+
+def _prepared_copy(net, engine, activation_qparams=None):
+    # fusing needs eval mode, the BatchNorm running statistics are folded in
+    actor = copy.deepcopy(net).cpu().eval()
+    _prepare_vision_convolutions(actor.vision, engine, activation_qparams)
+    return actor
+
+
+def calibrate_activations(net, calibration_observations, engine='fbgemm'):
+    """Activation qparams of the int8 convolutions, calibrated on calibration_observations.
+
+    Returns {module name: FixedQParamsObserver arguments} for requantize_actor.
+    """
+    actor = _prepared_copy(net, engine)
+    calibrate(actor, calibration_observations)
+    activation_qparams = {}
+    for name, module in actor.vision.named_modules():
+        observer = getattr(module, 'activation_post_process', None)
+        if observer is None:
+            continue
+        # the histogram search is the expensive part of converting, it runs once here
+        scale, zero_point = observer.calculate_qparams()
+        activation_qparams[name] = dict(scale=float(scale), zero_point=int(zero_point), dtype=observer.dtype,
+                                        quant_min=observer.quant_min, quant_max=observer.quant_max)
+    return activation_qparams
+
+
+def requantize_actor(net, activation_qparams, engine='fbgemm'):
+    """int8 copy of net using activation qparams from calibrate_activations.
+
+    The qparams can come from an earlier version of the weights, only the
+    weights are quantized again, so this costs no forward passes. engine has
+    to be the process's torch.backends.quantized.engine, the int8 copy only
+    runs on the engine its weights were packed for.
+    """
+    if torch.backends.quantized.engine != engine:
+        raise ValueError('Quantizing for {} but torch.backends.quantized.engine is {}'.format(
+            engine, torch.backends.quantized.engine))
+    actor = _prepared_copy(net, engine, activation_qparams)
+    convert(actor.vision, inplace=True)
+
+    quantize_dynamic(actor, set(QUANTIZED_LINEARS), dtype=torch.qint8, inplace=True)
+    actor.policy_hidden1 = _BatchedLinear(actor.policy_hidden1)
+    actor.policy_output = _BatchedLinear(actor.policy_output)
+    actor.vision.output = _BatchedLinear(actor.vision.output)
+    return actor
+
+
+def check_actor(net, actor, observations, kl_tolerance=0.01):
+    """Mean KL between net and its quantized actor, ValueError above kl_tolerance.
+
+    net is compared in the mode it is in, an actor collecting in train mode
+    normalizes with per-frame BatchNorm statistics, not the running ones the
+    int8 copy folded in.
+    """
+    reference = copy.deepcopy(net).cpu()
+    mean_kl, max_kl = action_kl(reference, actor, observations)
+    if mean_kl > kl_tolerance:
+        raise ValueError('Quantized actor diverges from the fp32 policy: mean KL {:.4g} '
+                         '(max {:.4g}) above tolerance {:.4g}'.format(mean_kl, max_kl, kl_tolerance))
+    return mean_kl
+
+
+def quantize_actor(net, calibration_observations, kl_tolerance=0.01, engine='fbgemm'):
+    """int8 copy of a HiveNet for collecting rollouts on CPU.
+
+    conv1/conv2 are statically quantized with their BatchNorm folded in and
+    calibrated on calibration_observations, the policy linears are dynamically
+    quantized. Raises ValueError if the mean KL between net and the int8
+    action distributions on the calibration observations exceeds kl_tolerance.
+    Returns the quantized copy and that mean KL; net itself is left untouched.
+    engine has to be selected as torch.backends.quantized.engine beforehand.
+    """
+    actor = requantize_actor(net, calibrate_activations(net, calibration_observations, engine), engine)
+    return actor, check_actor(net, actor, calibration_observations, kl_tolerance)
+
+
+class ActorQuantizer:
+    """Rebuilds an int8 actor whenever an actor process receives new weights.
+
+    record() stores calibration observations once and selects engine as the
+    process's quantized engine, calling the quantizer with
+    the freshly loaded fp32 net returns the copy to collect with. Calibration
+    and the KL check only run every refresh_versions weight versions, or
+    once refresh_seconds have passed; in between the new weights are
+    quantized with the last calibrated activation qparams. If the last
+    checked copy drifted further than kl_tolerance the fp32 net is used
+    until the next refresh.
+    """
+
+    def __init__(self, calibration_steps=64, kl_tolerance=0.01, engine='fbgemm',
+                 refresh_versions=20, refresh_seconds=None):
+        self.calibration_steps = calibration_steps
+        self.kl_tolerance = kl_tolerance
+        self.engine = engine
+        self.refresh_versions = refresh_versions
+        self.refresh_seconds = refresh_seconds
+        self.observations = None
+        self.activation_qparams = None
+        self.use_fp32 = False
+        self._versions_since_refresh = 0
+        self._refreshed_at = None
+
+    def record(self, env, net):
+        # record runs in the actor process, which only collects with int8 copies
+        torch.backends.quantized.engine = self.engine
+        self.observations = record_observations(env, net, self.calibration_steps)
+
+    def refresh_due(self):
+        if self.activation_qparams is None:
+            return True
+        if self.refresh_versions is not None and self._versions_since_refresh >= self.refresh_versions:
+            return True
+        return (self.refresh_seconds is not None
+                and time.monotonic() - self._refreshed_at >= self.refresh_seconds)
+
+    def __call__(self, net):
+        if not self.refresh_due():
+            self._versions_since_refresh += 1
+            return net if self.use_fp32 else requantize_actor(net, self.activation_qparams, self.engine)
+
+        self.activation_qparams = calibrate_activations(net, self.observations, self.engine)
+        self._versions_since_refresh = 1
+        self._refreshed_at = time.monotonic()
+        actor = requantize_actor(net, self.activation_qparams, self.engine)
+        try:
+            check_actor(net, actor, self.observations, self.kl_tolerance)
+        except ValueError as error:
+            warnings.warn('{}, collecting with the fp32 policy'.format(error))
+            self.use_fp32 = True
+            return net
+        self.use_fp32 = False
+        return actor
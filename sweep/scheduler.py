@@ -0,0 +1,333 @@
+"""Successive-halving hyperparameter sweeps of A2CTrainer, packed onto one node.
+
+Every value list is swept over its grid; trials train on terrains of a suite
+built with `python -m evaluation.evaluate build-suite`. Rerunning the same
+command after an interruption resumes the sweep from its checkpoints:
+    python -m sweep.scheduler sweeps/lr suites/train --workers 4 \\
+        --learning-rate 1e-3 3e-4 1e-4 --beta-entropy 0.01 0.001 --kernel-size 3 5
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+
+import numpy as np
+import torch
+
+from a2c.a2c import A2CTrainer
+from environment.simulation.utils.generate_map import Difficulty
+from environment.simulation.utils.terrain_store import TerrainStore
+from environment.swarmball_env import SwarmBall
+from environment.worker_factory import PRELOAD_MODULES, init_headless_worker, worker_context
+from policy_network.HiveNet import HiveNet
+from policy_network.checkpoint import load_checkpoint, save_policy
+
+TRAINER_PARAMETERS = ('gamma', 'beta_entropy', 'learning_rate', 'clip_size')
+NET_PARAMETERS = ('kernel_size', 'stride')
+DEFAULT_CONFIG = dict(gamma=0.99, beta_entropy=0.01, learning_rate=1e-3, clip_size=0.2,
+                      kernel_size=5, stride=2)
+
+STATE_FILE = 'sweep.json'
+CHECKPOINT_FILE = 'checkpoint.pt'
+
+# per worker process state, filled by _init_worker
+_worker = {}
+
+
+def grid(**values):
+    """Every combination of the given parameter values, on top of DEFAULT_CONFIG"""
+    names = sorted(values)
+    return [dict(DEFAULT_CONFIG, **dict(zip(names, combination)))
+            for combination in itertools.product(*(values[name] for name in names))]
+
+
+def available_cores():
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count()))
+
+
+def core_groups(workers, cores=None):
+    """Split cores, by default the ones this process may run on, into one disjoint group per worker"""
+    cores = available_cores() if cores is None else list(cores)
+    if workers >= len(cores):
+        return [[cores[worker % len(cores)]] for worker in range(workers)]
+    size = len(cores) // workers
+    return [cores[worker * size:(worker + 1) * size] for worker in range(workers)]
+
+
+class StoredTerrainEnv:
+    """SwarmBall that starts every episode on a random terrain of a TerrainStore"""
+
+    def __init__(self, env, store):
+        self.env = env
+        self.store = store
+
+    def reset(self):
+        difficulty, seed = random.choice(self.store.keys)
+        self.env.sim.difficulty = Difficulty(difficulty) if difficulty else None
+        self.env.sim.set_terrain(self.store.terrain(difficulty, seed))
+        return self.env.reset()
+
+    def step(self, action):
+        return self.env.step(action)
+
+    def render(self):
+        self.env.render()
+
+
+def _init_worker(core_queue, suite_path, number_of_clusters, env_kwargs):
+    init_headless_worker()
+    cores = core_queue.get()
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(len(cores))
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # already fixed by whatever ran torch code during the import
+        pass
+
+    # the env, and the torch and pygame imports behind it, are reused by every trial
+    env = SwarmBall(number_of_clusters=number_of_clusters, **env_kwargs)
+    _worker.update(env=StoredTerrainEnv(env, TerrainStore(suite_path)),
+                   number_of_clusters=number_of_clusters)
+
+
+def _random_state():
+    # plain lists and tuples, checkpoints have to load with torch.load(weights_only=True)
+    name, keys, position, has_gauss, cached_gaussian = np.random.get_state()
+    return {'python': random.getstate(),
+            'numpy': (name, keys.tolist(), position, has_gauss, cached_gaussian),
+            'torch': torch.get_rng_state()}
+
+
+def _set_random_state(state):
+    python_state = state['python']
+    random.setstate((python_state[0], tuple(python_state[1]), python_state[2]))
+    name, keys, position, has_gauss, cached_gaussian = state['numpy']
+    np.random.set_state((name, np.array(keys, dtype=np.uint32), position, has_gauss, cached_gaussian))
+    torch.set_rng_state(state['torch'])
+
+
+def _history(net):
+    # the collecting net carries its frame and threshold history over from one train() call to the next
+    return {'thresholds': net.thresholds_history and [tensor.detach() for tensor in net.thresholds_history],
+            'map': net.vision.map_history and [tensor.detach() for tensor in net.vision.map_history]}
+
+
+def _set_history(net, history):
+    net.thresholds_history = history['thresholds'] and list(history['thresholds'])
+    net.vision.map_history = history['map'] and list(history['map'])
+
+
+def save_trainer(trainer, path, **extra):
+    """Checkpoint the policy, the optimizer and the learner statistics of an A2CTrainer.
+
+    The file is written aside and renamed, so a run preempted while saving
+    keeps its previous checkpoint.
+    """
+    temporary_path = path + '.tmp'
+    save_policy(trainer.net, temporary_path,
+                optimizer=trainer.optimizer.state_dict(),
+                total_samples=trainer.total_samples,
+                total_updates=trainer.total_updates,
+                samples_to_reward=[(samples, float(reward))
+                                   for samples, reward in trainer.samples_to_reward],
+                random_state=_random_state(),
+                history=_history(trainer.net),
+                **extra)
+    os.replace(temporary_path, path)
+
+
+def load_trainer(trainer, path):
+    """Restore a save_trainer checkpoint into trainer, returns the whole checkpoint"""
+    checkpoint = load_checkpoint(path)
+    trainer.net.load_state_dict(checkpoint['state_dict'])
+    trainer.new_net.load_state_dict(checkpoint['state_dict'])
+    trainer.optimizer.load_state_dict(checkpoint['optimizer'])
+    trainer.total_samples = checkpoint['total_samples']
+    trainer.total_updates = checkpoint['total_updates']
+    trainer.samples_to_reward = [tuple(entry) for entry in checkpoint['samples_to_reward']]
+    _set_random_state(checkpoint['random_state'])
+    _set_history(trainer.net, checkpoint['history'])
+    return checkpoint
+
+
+def _run_rung(task):
+    """Train one trial up to the rung's cumulative budget, resuming from its checkpoint"""
+    trial_id, config, seed, rung, target_iterations, batch_size, checkpoint_interval, trial_dir = task
+    path = os.path.join(trial_dir, CHECKPOINT_FILE)
+    # seeded before the net is built so its initial weights only depend on seed,
+    # a resumed trial gets its random state back from the checkpoint instead
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    number_of_clusters = _worker['number_of_clusters']
+    net = HiveNet(config['kernel_size'], config['stride'], number_of_clusters)
+    trainer = A2CTrainer(net, 2 ** number_of_clusters, _worker['env'], batch_size,
+                         **{name: config[name] for name in TRAINER_PARAMETERS})
+
+    iterations, rung_rewards = 0, {}
+    if os.path.exists(path):
+        checkpoint = load_trainer(trainer, path)
+        iterations, rung_rewards = checkpoint['iterations'], checkpoint['rung_rewards']
+    else:
+        os.makedirs(trial_dir, exist_ok=True)
+
+    rewards = rung_rewards.setdefault(str(rung), [])
+    while iterations < target_iterations:
+        reward, _, _ = trainer.train()
+        rewards.append(float(reward))
+        iterations += 1
+        if iterations % checkpoint_interval == 0 or iterations == target_iterations:
+            save_trainer(trainer, path, iterations=iterations, rung_rewards=rung_rewards)
+    return trial_id, rung, float(np.mean(rewards)) if rewards else float('nan')
+
+
+class SweepScheduler:
+    """Runs a grid of A2CTrainer configs as a successive-halving sweep.
+
+    Trials train in a pool of long-lived worker processes, each pinned to its
+    own group of cores with torch limited to that many threads, and all
+    reading their terrains from one memory-mapped TerrainStore. A trial's
+    budget grows eta times per rung, starting at min_iterations train()
+    calls; after every rung only the best 1 / eta of the trials, by mean
+    reward over that rung, continue. Trials checkpoint every
+    checkpoint_interval iterations and the sweep state is saved after every
+    finished rung, so a sweep started again in the same sweep_dir picks up
+    where it was stopped.
+    """
+
+    def __init__(self, sweep_dir, configs, suite_path, workers=None, cores=None,
+                 min_iterations=4, eta=2, rungs=None, batch_size=128, checkpoint_interval=1,
+                 number_of_clusters=3, seed=0, start_method='forkserver', **env_kwargs):
+        self.sweep_dir = sweep_dir
+        self.suite_path = suite_path
+        self.workers = workers or len(available_cores() if cores is None else cores)
+        self.cores = cores
+        self.batch_size = batch_size
+        self.checkpoint_interval = checkpoint_interval
+        self.number_of_clusters = number_of_clusters
+        self.env_kwargs = env_kwargs
+        self._context = worker_context(start_method, PRELOAD_MODULES + ('a2c.a2c',))
+
+        state_path = os.path.join(sweep_dir, STATE_FILE)
+        if os.path.exists(state_path):
+            with open(state_path) as state_file:
+                self.state = json.load(state_file)
+        else:
+            rungs = rungs or int(math.floor(math.log(len(configs), eta) + 1e-9)) + 1
+            self.state = {
+                'min_iterations': min_iterations, 'eta': eta, 'rungs': rungs,
+                'trials': {'trial_{:03d}'.format(index): {'config': config, 'seed': seed + index,
+                                                          'scores': [], 'stopped_at': None}
+                           for index, config in enumerate(configs)},
+                'promoted_rungs': []}
+            os.makedirs(sweep_dir, exist_ok=True)
+            self.save_state()
+
+    @property
+    def trials(self):
+        return self.state['trials']
+
+    def save_state(self):
+        path = os.path.join(self.sweep_dir, STATE_FILE)
+        with open(path + '.tmp', 'w') as state_file:
+            json.dump(self.state, state_file, indent=1)
+        os.replace(path + '.tmp', path)
+
+    def budget(self, rung):
+        return self.state['min_iterations'] * self.state['eta'] ** rung
+
+    def active_trials(self):
+        return [trial_id for trial_id, trial in sorted(self.trials.items())
+                if trial['stopped_at'] is None]
+
+    def _promote(self, rung):
+        """Stop every trial outside the best 1 / eta of rung"""
+        active = self.active_trials()
+        keep = max(1, int(math.ceil(len(active) / self.state['eta'])))
+        ranked = sorted(active, key=lambda trial_id: self.trials[trial_id]['scores'][rung], reverse=True)
+        for trial_id in ranked[keep:]:
+            self.trials[trial_id]['stopped_at'] = rung
+
+    def run(self):
+        """Run the sweep to the end, returns leaderboard()"""
+        core_queue = self._context.Queue()
+        for cores in core_groups(self.workers, self.cores):
+            core_queue.put(cores)
+        pool = self._context.Pool(self.workers, initializer=_init_worker,
+                                  initargs=(core_queue, self.suite_path, self.number_of_clusters,
+                                            self.env_kwargs))
+        try:
+            for rung in range(self.state['rungs']):
+                active = self.active_trials()
+                tasks = [(trial_id, self.trials[trial_id]['config'], self.trials[trial_id]['seed'], rung,
+                          self.budget(rung), self.batch_size, self.checkpoint_interval,
+                          os.path.join(self.sweep_dir, trial_id))
+                         for trial_id in active if len(self.trials[trial_id]['scores']) <= rung]
+                for trial_id, _, score in pool.imap_unordered(_run_rung, tasks):
+                    self.trials[trial_id]['scores'].append(score)
+                    self.save_state()
+
+                if rung == self.state['rungs'] - 1 or len(active) == 1:
+                    break
+                # a resumed sweep passes the rungs it already finished again
+                if rung not in self.state['promoted_rungs']:
+                    self._promote(rung)
+                    self.state['promoted_rungs'].append(rung)
+                    self.save_state()
+        finally:
+            pool.close()
+            pool.join()
+        return self.leaderboard()
+
+    def leaderboard(self):
+        """(trial_id, config, rungs finished, last score), best first"""
+        rows = [(trial_id, trial['config'], len(trial['scores']),
+                 trial['scores'][-1] if trial['scores'] else float('-inf'))
+                for trial_id, trial in self.trials.items()]
+        return sorted(rows, key=lambda row: (row[2], row[3]), reverse=True)
+
+
+def print_leaderboard(rows):
+    names = TRAINER_PARAMETERS + NET_PARAMETERS
+    print('{:<10}'.format('trial') + ''.join('{:>14}'.format(name) for name in names)
+          + '{:>8}{:>12}'.format('rungs', 'reward'))
+    for trial_id, config, rungs, score in rows:
+        print('{:<10}'.format(trial_id) + ''.join('{:>14g}'.format(config[name]) for name in names)
+              + '{:>8}{:>12.2f}'.format(rungs, score))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('sweep_dir')
+    parser.add_argument('suite', help='terrain suite the trials train on')
+    parser.add_argument('--workers', type=int, default=None, help='defaults to one per available core')
+    parser.add_argument('--min-iterations', type=int, default=4, help='train() calls of every trial in rung 0')
+    parser.add_argument('--eta', type=int, default=2)
+    parser.add_argument('--rungs', type=int, default=None)
+    parser.add_argument('--batch-size', type=int, default=128)
+    parser.add_argument('--checkpoint-interval', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--physics', default='pymunk', choices=['pymunk', 'numpy'])
+    parser.add_argument('--start-method', default='forkserver', choices=['forkserver', 'spawn', 'fork'])
+    for name in TRAINER_PARAMETERS:
+        parser.add_argument('--' + name.replace('_', '-'), type=float, nargs='+', default=[DEFAULT_CONFIG[name]])
+    for name in NET_PARAMETERS:
+        parser.add_argument('--' + name.replace('_', '-'), type=int, nargs='+', default=[DEFAULT_CONFIG[name]])
+    args = parser.parse_args()
+
+    configs = grid(**{name: getattr(args, name) for name in TRAINER_PARAMETERS + NET_PARAMETERS})
+    scheduler = SweepScheduler(args.sweep_dir, configs, args.suite, workers=args.workers,
+                               min_iterations=args.min_iterations, eta=args.eta, rungs=args.rungs,
+                               batch_size=args.batch_size, checkpoint_interval=args.checkpoint_interval,
+                               seed=args.seed, start_method=args.start_method, physics=args.physics)
+    print_leaderboard(scheduler.run())
+
+
+if __name__ == '__main__':
+    main()